@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""Benchmarks for the compass_check hot paths: heading acquisition on both
+transports (against the cc.sim simulated glider), sensor line parsing, point
+computation, printing, CSV export, saved data persistence and plotting.
+
+Results are written as JSON, one record per benchmark and parameter set
+(any other output goes to stderr):
+
+    python benchmarks/run_benchmarks.py -o results.json
+
+Compare the ``median`` seconds of two result files to spot regressions.
+"""
+import functools
+import json
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+import compass_check
+from cc.sensor_parser import parse_sensors, sensor_dict
+from cc.sim import SimulatedGlider, PtyGlider, SimulatedDockserverComm
+
+parser = optparse.OptionParser(usage='%prog [options]', description=__doc__)
+parser.add_option(
+    '-o', '--output', dest='output', default=None,
+    help='write the JSON results to this file instead of stdout')
+parser.add_option(
+    '-n', '--samples', dest='samples', default='10,50,200',
+    help='comma separated n_samples values to scale over (default 10,50,200)')
+parser.add_option(
+    '-p', '--points', dest='points', default='8,36,360',
+    help='comma separated numbers of compass points (default 8,36,360)')
+parser.add_option(
+    '-r', '--repeat', dest='repeat', default=5, type=int,
+    help='number of timed repeats of each benchmark (default 5)')
+parser.add_option(
+    '--line-rate', dest='line_rate', default=4., type=float,
+    help='simulated glider report cycles per second (default 4)')
+parser.add_option(
+    '--junk', dest='junk', default=6, type=int,
+    help='other sensor/junk lines the glider prints per cycle (default 6)')
+
+
+class Devnull():
+    """Swallows console output while timing."""
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def time_it(func, repeat, setup=None):
+    """Return the min and median seconds of REPEAT calls of FUNC, calling
+    SETUP (untimed) before each.
+    """
+    times = []
+    stdout = sys.stdout
+    try:
+        for ii in range(repeat):
+            if setup is not None:
+                setup()
+            sys.stdout = Devnull()
+            start = timeit.default_timer()
+            func()
+            times.append(timeit.default_timer() - start)
+            sys.stdout = stdout
+    finally:
+        sys.stdout = stdout
+    return {'min': min(times), 'median': float(np.median(times)),
+            'repeat': repeat}
+
+
+def make_compass_data(n_samples, n_points):
+    """A CompassData filled with N_POINTS simulated points of N_SAMPLES.
+    """
+    sim = SimulatedGlider(
+        deviation=(0.5, 2., -1., 0.3, 0.), noise=0.5, seed=0)
+    # no connection is needed, the points are filled in directly
+    cd = compass_check.CompassData(
+        'benchglider', None, 0., np.deg2rad(15.), n_samples=n_samples,
+        glider=sim)
+    for hdg in np.linspace(0, 360, n_points, endpoint=False):
+        sim.set_heading(hdg)
+        hdgs = [sim.magnetic_heading() for ii in range(n_samples)]
+        cd.data[float(hdg)] = {'compass_sample_rad': hdgs}
+    cd.recompute()
+    return cd, sim
+
+
+def bench_parsers(results, options):
+    sim = SimulatedGlider(junk=options.junk, seed=0)
+    lines = []
+    while len(lines) < 10000:
+        lines.extend(sim.cycle_lines())
+    for name, func in [('parse_sensors', parse_sensors),
+                       ('sensor_dict', sensor_dict)]:
+        timing = time_it(
+            lambda: [func(line) for line in lines], options.repeat)
+        timing['lines_per_second'] = len(lines) / timing['median']
+        results.append(
+            {'benchmark': name, 'params': {'lines': len(lines)},
+             'seconds': timing})
+
+
+def bench_compute(results, options, n_samples, n_points):
+    params = {'n_samples': n_samples, 'n_points': n_points}
+    cd, sim = make_compass_data(n_samples, n_points)
+    hdgs = [sim.magnetic_heading() for ii in range(n_samples)]
+    results.append({
+        'benchmark': 'add_compass_point', 'params': params,
+        'seconds': time_it(
+            lambda: cd.add_compass_point(45, hdgs), options.repeat)})
+    results.append({
+        'benchmark': 'recompute', 'params': params,
+        'seconds': time_it(cd.recompute, options.repeat)})
+    results.append({
+        'benchmark': 'print_headings', 'params': params,
+        'seconds': time_it(cd.print_headings, options.repeat)})
+    results.append({
+        'benchmark': 'write_data', 'params': params,
+        'seconds': time_it(cd.write_data, options.repeat)})
+    results.append({
+        'benchmark': 'pickler.write', 'params': params,
+        'seconds': time_it(
+            lambda: cd.pickler.write(45, hdgs), options.repeat)})
+    results.append({
+        'benchmark': 'pickler.read', 'params': params,
+        'seconds': time_it(cd.pickler.read, options.repeat)})
+    results.append({
+        'benchmark': 'plot_data', 'params': params,
+        'seconds': time_it(
+            cd.plot_data, options.repeat, setup=lambda: plt.close('all'))})
+    cd.pickler.remove()
+
+
+def bench_read_headings(results, options, n_samples):
+    params = {'n_samples': n_samples, 'line_rate': options.line_rate,
+              'junk': options.junk}
+    sim = SimulatedGlider(
+        line_rate=options.line_rate, junk=options.junk, seed=0)
+    # acquisition is bound by the line rate, so fewer repeats will do
+    repeat = min(options.repeat, 3)
+
+    from cc.serial_rf import GliderRF
+    with PtyGlider(sim) as pty:
+        with GliderRF('benchglider', pty.port) as glider:
+            timing = time_it(
+                lambda: glider.read_headings(n_samples), repeat)
+    timing['ideal'] = n_samples / options.line_rate
+    results.append({
+        'benchmark': 'GliderRF.read_headings', 'params': params,
+        'seconds': timing})
+
+    try:
+        from cc.dockserver_com import dockserverCom
+    except ImportError as err:
+        results.append({
+            'benchmark': 'dockserverCom.read_headings', 'params': params,
+            'skipped': str(err)})
+        return
+    comm = functools.partial(SimulatedDockserverComm, glider=sim)
+    with dockserverCom('benchglider', 'localhost', comm_class=comm) as glider:
+        timing = time_it(lambda: glider.read_headings(n_samples), repeat)
+    timing['ideal'] = n_samples / options.line_rate
+    results.append({
+        'benchmark': 'dockserverCom.read_headings', 'params': params,
+        'seconds': timing})
+
+
+def main():
+    (options, args) = parser.parse_args()
+    samples = [int(value) for value in options.samples.split(',')]
+    points = [int(value) for value in options.points.split(',')]
+
+    # keep saved data and exported files out of the user's directories
+    workdir = tempfile.mkdtemp(prefix='cc_bench_')
+    os.environ['HOME'] = workdir
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = []
+    # the connections' messages go to stderr, leaving stdout to the JSON
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        bench_parsers(results, options)
+        for n_samples in samples:
+            for n_points in points:
+                bench_compute(results, options, n_samples, n_points)
+        for n_samples in samples:
+            bench_read_headings(results, options, n_samples)
+    finally:
+        sys.stdout = stdout
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    report = json.dumps(
+        {'version': compass_check.VERSION, 'results': results}, indent=1)
+    if options.output:
+        with open(options.output, 'w') as fid:
+            fid.write(report + '\n')
+    else:
+        print report
+
+
+if __name__ == '__main__':
+    main()
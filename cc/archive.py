@@ -0,0 +1,382 @@
+""" archive.py
+Loading of saved compass checks from every format compass_check has
+written, and a columnar NumPy (.npz) archive to gather them in.
+
+Checks are read from the results CSV files (transposed: one row per value,
+one column per compass point), from the data pickles older versions left in
+~/.cc and from session journals (see cc.journal).  Each becomes an
+ArchivedCheck.  ``write_archive`` stores any number of checks as flat
+arrays: one entry per check for the check's settings and one row per
+compass point, with ``point_start`` and ``n_points`` giving each check's
+rows.
+"""
+import cPickle as cp
+import hashlib
+import os
+import os.path
+import re
+from datetime import datetime as dt
+from exceptions import Exception
+
+import numpy as np
+
+from cc.circstats import compass_points
+from cc.compass_store import CompassStore, COLUMNS, SAMPLES_KEY
+from cc.journal import SessionJournal
+
+# results CSV row headers and the column each holds
+CSV_ROWS = {
+    'Pedestal Heading:': 'pedestal_deg',
+    'Glider True Heading:': 'glider_true_deg',
+    'Compass Magnetic Reading:': 'compass_mag_deg',
+    'Compass True Heading:': 'compass_true_deg',
+    'Compass Std Dev:': 'compass_std_deg',
+    'Samples:': 'n_samples',
+    'Error:': 'error'}
+
+# per-point columns kept in the archive
+POINT_COLUMNS = (
+    'pedestal_deg', 'glider_true_deg', 'compass_mag_deg',
+    'compass_true_deg', 'compass_std_deg', 'n_samples', 'error')
+
+# file name of saved data: <glider>_cc_<yyyy-mm-dd>[_HHMM].<ext>
+FNAME_RE = re.compile(
+    r'^(?P<glider>.+)_cc_(?P<date>\d{4}-\d{2}-\d{2})(_(?P<time>\d{4}))?')
+
+# formats a check can be read from, most complete first
+EXTENSIONS = ('.csv', '.ccj', '.pckl')
+
+
+class ArchiveException(Exception):
+    pass
+
+
+class ArchivedCheck():
+    """One saved compass check.  ``columns`` holds an n_points array for
+    each of POINT_COLUMNS in pedestal heading order and ``samples`` the
+    (n_points, n_samples) compass headings in radians, padded with NaN.
+    ``time`` ('HH:MM') is None when the source did not record it.
+    """
+    def __init__(self, glider, date, time, offset_deg, declination_deg,
+                 columns, samples, source):
+        self.glider = glider
+        self.date = date
+        self.time = time
+        self.offset_deg = offset_deg
+        self.declination_deg = declination_deg
+        self.columns = columns
+        self.samples = samples
+        self.source = source
+
+    def __len__(self):
+        return len(self.columns['pedestal_deg'])
+
+    def column(self, key):
+        return self.columns[key]
+
+    @property
+    def tstamp(self):
+        return dt.strptime(
+            '%s %s' % (self.date, self.time or '00:00'), '%Y-%m-%d %H:%M')
+
+    def digest(self):
+        """Groups checks that may be the same check read from different
+        files (e.g. its CSV and a leftover pickle): the glider, date and
+        pedestal headings.  Use same_as to tell them apart.
+        """
+        digest = hashlib.sha1()
+        digest.update('%s %s' % (self.glider, self.date))
+        digest.update(np.round(self.columns['pedestal_deg']).astype(
+            int).tostring())
+        return digest.hexdigest()
+
+    def same_as(self, other):
+        """Whether OTHER holds the same compass points, to the precision
+        the CSV files keep.
+        """
+        return (self.digest() == other.digest() and np.allclose(
+            self.columns['error'], other.columns['error'], rtol=0.,
+            atol=0.01))
+
+    def validate(self):
+        """Raise ArchiveException unless the check is complete and its
+        values are in range.
+        """
+        n_points = len(self)
+        if not n_points:
+            raise ArchiveException('%s: no compass points' % self.source)
+        for key in POINT_COLUMNS:
+            if len(self.columns[key]) != n_points:
+                raise ArchiveException(
+                    '%s: %d %s values for %d points'
+                    % (self.source, len(self.columns[key]), key, n_points))
+        if self.samples.shape[0] != n_points:
+            raise ArchiveException(
+                '%s: samples for %d of %d points'
+                % (self.source, self.samples.shape[0], n_points))
+        pedestal = self.columns['pedestal_deg']
+        # compass_check accepts 360 as well as 0 for north
+        if np.any(~np.isfinite(pedestal)) or np.any(pedestal < 0) \
+                or np.any(pedestal > 360):
+            raise ArchiveException(
+                '%s: pedestal headings out of range' % self.source)
+        if len(np.unique(pedestal)) != n_points:
+            raise ArchiveException(
+                '%s: repeated pedestal headings' % self.source)
+        error = self.columns['error']
+        if np.any(~np.isfinite(error)) or np.any(np.abs(error) > 180):
+            raise ArchiveException('%s: errors out of range' % self.source)
+        samples = self.samples[~np.isnan(self.samples)]
+        if np.any(np.abs(samples) > 2 * np.pi + 0.01):
+            raise ArchiveException(
+                '%s: samples are not headings in radians' % self.source)
+
+
+def _fname_info(path):
+    """The glider name, date and time ('HH:MM' or None) in the name of a
+    saved data file.
+    """
+    match = FNAME_RE.match(os.path.basename(path))
+    if match is None:
+        raise ArchiveException('%s: not a compass check file name' % path)
+    time = match.group('time')
+    if time is not None:
+        time = time[:2] + ':' + time[2:]
+    return match.group('glider'), match.group('date'), time
+
+
+def _float(field):
+    field = field.strip()
+    if not field:
+        return np.nan
+    return float(field)
+
+
+def read_csv(path):
+    """Read the check from a results CSV file written by
+    CompassData.write_data.  The samples were written in radians.
+    """
+    with open(path, 'r') as fid:
+        lines = [line.rstrip('\r\n') for line in fid]
+    if not lines:
+        raise ArchiveException('%s: empty file' % path)
+    title = lines[0].split(',')
+    if len(title) < 8 or title[1] != 'Compass Check':
+        raise ArchiveException('%s: not a compass check CSV' % path)
+    try:
+        offset = float(title[5].split()[0])
+        declination = float(title[7].split()[0])
+    except (ValueError, IndexError):
+        raise ArchiveException('%s: bad title line' % path)
+    columns = {}
+    sample_rows = []
+    in_data = False
+    for line in lines[1:]:
+        if not line.strip():
+            continue
+        fields = line.split(',')
+        try:
+            if fields[0] == 'Data:':
+                in_data = True
+            if in_data:
+                sample_rows.append([_float(field) for field in fields[1:]])
+            elif fields[0] in CSV_ROWS:
+                columns[CSV_ROWS[fields[0]]] = np.array(
+                    [_float(field) for field in fields[1:]])
+        except ValueError:
+            raise ArchiveException('%s: bad value in %r' % (path, line))
+    if 'pedestal_deg' not in columns:
+        raise ArchiveException('%s: no pedestal headings' % path)
+    n_points = len(columns['pedestal_deg'])
+    if sample_rows:
+        if any(len(row) != n_points for row in sample_rows):
+            raise ArchiveException('%s: ragged Data rows' % path)
+        samples = np.array(sample_rows).T
+    else:
+        samples = np.full((n_points, 0), np.nan)
+    counts = (~np.isnan(samples)).sum(axis=1)
+    # older versions did not write these rows
+    columns.setdefault('n_samples', counts.astype(float))
+    if 'compass_std_deg' not in columns:
+        columns['compass_std_deg'] = compass_points(
+            samples, columns['pedestal_deg'], offset,
+            np.deg2rad(declination))['compass_std_deg']
+    for key in POINT_COLUMNS:
+        columns.setdefault(key, np.full(n_points, np.nan))
+    glider, date, time = title[0], title[2], title[3]
+    return ArchivedCheck(
+        glider, date, time, offset, declination, columns, samples, path)
+
+
+def _from_store(store, glider, date, time, declination_deg, path):
+    columns = dict((key, store.column(key).copy()) for key in COLUMNS)
+    columns['n_samples'] = store.column('n_samples').astype(float)
+    offset = np.nan
+    if len(store):
+        # the offset was not saved, but is where the glider pointed
+        offset = float(((columns['glider_true_deg'][0] -
+                         columns['pedestal_deg'][0] + 180) % 360) - 180)
+    return ArchivedCheck(
+        glider, date, time, offset, declination_deg, columns,
+        store.samples().copy(), path)
+
+
+def read_pickle(path):
+    """Read the check from a data pickle left in ~/.cc by an older
+    version, either a dict of per-point dicts or a CompassStore.
+    """
+    glider, date, time = _fname_info(path)
+    try:
+        with open(path, 'rb') as fid:
+            data, mag_var = cp.load(fid)
+    except Exception as err:
+        raise ArchiveException('%s: unreadable pickle (%s)' % (path, err))
+    if isinstance(data, dict):
+        data = CompassStore.from_dict(data)
+    if mag_var is None:
+        raise ArchiveException('%s: no magnetic declination' % path)
+    return _from_store(data, glider, date, time, np.rad2deg(mag_var), path)
+
+
+def read_journal(path):
+    """Read the check from a session journal (see cc.journal) left in
+    ~/.cc by an unfinished check.
+    """
+    header, points = SessionJournal(path).replay()
+    if header is None or header.get('mag_var') is None:
+        raise ArchiveException('%s: no journal header' % path)
+    glider, date, time = _fname_info(path)
+    store = CompassStore(header.get('n_samples', 10))
+    for hdg, point in points.iteritems():
+        store[hdg] = {SAMPLES_KEY: point['samples']}
+    store.update_columns(compass_points(
+        store.samples(), store.column('pedestal_deg'),
+        header.get('offset', 0.), header['mag_var']))
+    check = _from_store(
+        store, header.get('glider', glider), header.get('date', date), time,
+        np.rad2deg(header['mag_var']), path)
+    check.offset_deg = header.get('offset', check.offset_deg)
+    return check
+
+
+READERS = {'.csv': read_csv, '.pckl': read_pickle, '.ccj': read_journal}
+
+
+def read_check(path):
+    """Read and validate the check saved in PATH, in any of the formats
+    in READERS.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in READERS:
+        raise ArchiveException('%s: unknown file type' % path)
+    check = READERS[ext](path)
+    check.validate()
+    return check
+
+
+def read_saved(path):
+    """Read the checks saved in PATH: every check of a .npz archive, or
+    the one check of any other saved file.
+    """
+    if os.path.splitext(path)[1].lower() == '.npz':
+        return read_archive(path)
+    return [read_check(path)]
+
+
+def find_files(paths, extensions=EXTENSIONS):
+    """Yield every saved check file in PATHS, searching directories for
+    files with one of EXTENSIONS.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for drctry, subdirs, fnames in os.walk(path):
+            subdirs.sort()
+            for fname in sorted(fnames):
+                base, ext = os.path.splitext(fname)
+                if ext.lower() not in extensions:
+                    continue
+                # written alongside the results, but not checks themselves
+                if base.endswith(('_deviation', '_long')):
+                    continue
+                yield os.path.join(drctry, fname)
+
+
+def source_rank(check):
+    """Sort key preferring the most complete copy of a check.
+    """
+    ext = os.path.splitext(check.source)[1].lower()
+    if ext not in EXTENSIONS:
+        return len(EXTENSIONS), check.source
+    return EXTENSIONS.index(ext), check.source
+
+
+def dedupe(checks):
+    """Keep one of each check, matched by glider, date and time or by
+    content.
+    """
+    kept = []
+    by_digest = {}
+    keys = set()
+    for check in sorted(checks, key=source_rank):
+        key = (check.glider, check.date, check.time)
+        if check.time is not None and key in keys:
+            continue
+        similar = by_digest.setdefault(check.digest(), [])
+        if any(check.same_as(other) for other in similar):
+            continue
+        similar.append(check)
+        keys.add(key)
+        kept.append(check)
+    kept.sort(key=lambda check: (check.glider, check.date, check.time))
+    return kept
+
+
+def write_archive(path, checks):
+    """Write CHECKS (ArchivedChecks) to the compressed .npz archive at
+    PATH.
+    """
+    checks = list(checks)
+    n_points = np.array([len(check) for check in checks], dtype=int)
+    point_start = np.concatenate([[0], np.cumsum(n_points)[:-1]])
+    width = max([check.samples.shape[1] for check in checks] + [0])
+    samples = np.full((n_points.sum(), width), np.nan)
+    for start, check in zip(point_start, checks):
+        samples[start:start + len(check), :check.samples.shape[1]] = \
+            check.samples
+    arrays = {
+        'glider': np.array([check.glider for check in checks]),
+        'date': np.array([check.date for check in checks]),
+        'time': np.array([check.time or '' for check in checks]),
+        'offset_deg': np.array([check.offset_deg for check in checks]),
+        'declination_deg': np.array(
+            [check.declination_deg for check in checks]),
+        'source': np.array([check.source for check in checks]),
+        'point_start': point_start.astype(int),
+        'n_points': n_points,
+        'check': np.repeat(np.arange(len(checks)), n_points),
+        'samples_rad': samples}
+    for key in POINT_COLUMNS:
+        arrays[key] = np.concatenate(
+            [check.columns[key] for check in checks] + [np.zeros(0)])
+    np.savez_compressed(path, **arrays)
+
+
+def read_archive(path):
+    """Read the ArchivedChecks back from an archive written by
+    write_archive.
+    """
+    arrays = np.load(path)
+    checks = []
+    for ii in range(len(arrays['glider'])):
+        start = arrays['point_start'][ii]
+        rows = slice(start, start + arrays['n_points'][ii])
+        checks.append(ArchivedCheck(
+            str(arrays['glider'][ii]), str(arrays['date'][ii]),
+            str(arrays['time'][ii]) or None,
+            float(arrays['offset_deg'][ii]),
+            float(arrays['declination_deg'][ii]),
+            dict((key, arrays[key][rows]) for key in POINT_COLUMNS),
+            arrays['samples_rad'][rows], str(arrays['source'][ii])))
+    return checks
@@ -0,0 +1,102 @@
+""" capture.py
+Records the raw output of a glider connection during each compass point so
+a check can be reprocessed later (see compass_replay.py).
+
+A capture file is plain text, one record per line, tab separated::
+
+    H   <JSON header: glider, timestamp, offset, mag_var, n_samples>
+    P   <time>  <pedestal heading>      start of a compass point
+    L   <time>  <raw line>              glider output during the point
+    E   <time>  <pedestal heading>  [<JSON headings>]   end of the point
+
+Times are seconds since the epoch.  The end record lists the headings
+(radians) the check used for the point, e.g. a streamed point's settled
+window, when the point was recorded.
+"""
+import json
+import threading
+import time
+
+
+class CaptureWriter():
+    """Writes a capture file.  Register it with a glider connection's
+    ``listeners`` to receive its output; only lines arriving between
+    ``begin_point`` and ``end_point`` are kept.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fid = open(path, 'a')
+        self.recording = False
+        self._lock = threading.Lock()
+
+    def _write(self, *fields):
+        with self._lock:
+            self.fid.write('\t'.join(fields) + '\n')
+
+    def write_header(self, **settings):
+        self._write('H', json.dumps(settings))
+        self.fid.flush()
+
+    def begin_point(self, pd_hdg):
+        self._write('P', '%.6f' % time.time(), repr(pd_hdg))
+        self.recording = True
+
+    def end_point(self, pd_hdg, hdgs=None):
+        """End the point at PD_HDG, recording the headings HDGS the check
+        used for it, if any.
+        """
+        self.recording = False
+        fields = ['E', '%.6f' % time.time(), repr(pd_hdg)]
+        if hdgs is not None:
+            fields.append(json.dumps([float(hdg) for hdg in hdgs]))
+        self._write(*fields)
+        self.fid.flush()
+
+    def feed(self, line, sensors):
+        """Called by the connection's reader thread with every line.  Never
+        completes, so it stays registered.
+        """
+        if self.fid.closed:
+            # the connection may outlive the check, e.g. in a DockserverPool
+            return True
+        if self.recording:
+            self._write('L', '%.6f' % time.time(), line.rstrip('\r\n'))
+        return False
+
+    def close(self):
+        with self._lock:
+            self.recording = False
+            self.fid.close()
+
+
+def read_capture(path):
+    """Read the capture file at PATH.  Returns (header, points), where
+    header is the last header's dictionary and points a list of
+    (pedestal heading, [(time, line), ...], headings used) tuples in the
+    order taken.  The headings used are None when not recorded, e.g. in
+    older captures.  Points without an end record (an interrupted read)
+    are dropped.
+    """
+    header = {}
+    points = []
+    current = None
+    with open(path, 'r') as fid:
+        for record in fid:
+            record = record.rstrip('\n')
+            kind = record[:1]
+            if kind == 'L' and current is not None:
+                tag, tstamp, line = record.split('\t', 2)
+                current[1].append((float(tstamp), line))
+            elif kind == 'P':
+                tag, tstamp, pd_hdg = record.split('\t')
+                current = (float(pd_hdg), [])
+            elif kind == 'E' and current is not None:
+                fields = record.split('\t')
+                hdgs = None
+                if len(fields) > 3:
+                    hdgs = json.loads(fields[3])
+                points.append(current + (hdgs,))
+                current = None
+            elif kind == 'H':
+                header = json.loads(record.split('\t', 1)[1])
+    return header, points
@@ -0,0 +1,95 @@
+""" circstats.py
+Circular (directional) statistics for compass headings.
+
+Every function works along the last axis of its input so a whole compass
+check, held as an (n_points, n_samples) array of headings in radians, is
+computed in one call.  Missing samples may be given as NaN and are ignored.
+"""
+import numpy as np
+
+TWO_PI = 2 * np.pi
+
+
+def _resultant(angles):
+    """Return the summed cosines, summed sines and sample counts of ANGLES
+    along the last axis, skipping NaNs.
+    """
+    angles = np.asarray(angles, dtype=float)
+    valid = ~np.isnan(angles)
+    filled = np.where(valid, angles, 0.)
+    cos_sum = np.where(valid, np.cos(filled), 0.).sum(axis=-1)
+    sin_sum = np.where(valid, np.sin(filled), 0.).sum(axis=-1)
+    return cos_sum, sin_sum, valid.sum(axis=-1)
+
+
+def circ_mean(angles):
+    """Mean direction of ANGLES (radians) in the range 0 to 2*pi.  Unlike
+    an arithmetic mean this is correct for samples either side of north.
+    """
+    cos_sum, sin_sum, count = _resultant(angles)
+    return np.arctan2(sin_sum, cos_sum) % TWO_PI
+
+
+def resultant_length(angles):
+    """Mean resultant length of ANGLES (radians), from 0 (uniformly
+    spread) to 1 (all identical).
+    """
+    cos_sum, sin_sum, count = _resultant(angles)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.hypot(cos_sum, sin_sum) / count
+
+
+def circ_std(angles):
+    """Circular standard deviation of ANGLES in radians.
+    """
+    r_bar = np.clip(resultant_length(angles), 0., 1.)
+    with np.errstate(divide='ignore'):
+        return np.sqrt(2 * np.log(1. / r_bar))
+
+
+def circ_stderr(angles):
+    """Approximate standard error of the circular mean of ANGLES in
+    radians (the circular standard deviation over the square root of the
+    sample count).
+    """
+    cos_sum, sin_sum, count = _resultant(angles)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return circ_std(angles) / np.sqrt(count)
+
+
+def wrap_rad(radians):
+    """Wrap RADIANS into the range -pi to pi.
+    """
+    return ((np.asarray(radians, dtype=float) + np.pi) % TWO_PI) - np.pi
+
+
+def wrap_deg(degrees):
+    """Wrap DEGREES into the range -180 to 180.
+    """
+    return ((np.asarray(degrees, dtype=float) + 180) % 360) - 180
+
+
+def compass_points(samples_rad, pedestal_deg, offset, mag_var):
+    """Calculate the compass check values for every point at once.
+
+    SAMPLES_RAD is an (n_points, n_samples) array of magnetic compass
+    headings in radians and PEDESTAL_DEG the n_points pedestal headings in
+    degrees.  OFFSET (degrees) is the glider's rotation from the pedestal
+    and MAG_VAR (radians) the magnetic declination.  Returns a dictionary of
+    n_points arrays keyed like CompassData.data entries.
+    """
+    pedestal_deg = np.asarray(pedestal_deg, dtype=float)
+    # compass headings added together need to be kept in the correct
+    # compass ranges (0-360, 0-2*pi) and so uses mod (%) 360 or 2*pi
+    mag_rad = circ_mean(samples_rad)
+    true_rad = (mag_rad + mag_var) % TWO_PI
+    true_deg = np.rad2deg(true_rad)
+    g_true_deg = pedestal_deg + offset
+    return {
+        'glider_true_deg': g_true_deg % 360.,
+        'compass_mag_rad': mag_rad,
+        'compass_mag_deg': np.rad2deg(mag_rad),
+        'compass_true_rad': true_rad,
+        'compass_true_deg': true_deg,
+        'compass_std_deg': np.rad2deg(circ_std(samples_rad)),
+        'error': wrap_deg(g_true_deg - true_deg)}
@@ -0,0 +1,192 @@
+""" compass_store.py
+Columnar storage for the compass points of a compass check.
+
+Each value of a compass point (pedestal heading, errors, etc.) is kept in
+its own preallocated NumPy array and the raw samples in a 2-D block padded
+with NaN, with the rows always sorted by pedestal heading.  Sorted iteration,
+export and plotting then work directly on array views.
+
+For compatibility a CompassStore also behaves like the original dictionary
+of per-point dictionaries keyed by pedestal heading, e.g.
+``store[90]['error']`` or ``store[90] = point_dict``.
+"""
+import numpy as np
+
+# per-point values held in their own column
+COLUMNS = (
+    'pedestal_deg', 'glider_true_deg', 'compass_mag_rad', 'compass_mag_deg',
+    'compass_true_rad', 'compass_true_deg', 'compass_std_deg', 'error')
+
+SAMPLES_KEY = 'compass_sample_rad'
+
+# the number of samples of each point
+COUNT_KEY = 'n_samples'
+
+
+class CompassStore(object):
+    """Array-backed container of compass points sorted by pedestal heading.
+    """
+    def __init__(self, n_samples=10, capacity=36):
+        self._n = 0
+        self._capacity = capacity
+        self._columns = dict(
+            (key, np.full(capacity, np.nan)) for key in COLUMNS)
+        self._samples = np.full((capacity, n_samples), np.nan)
+        self._counts = np.zeros(capacity, dtype=int)
+
+    @classmethod
+    def from_dict(cls, data, n_samples=10):
+        """Build a store from the legacy dict-of-dicts ``CompassData.data``.
+        """
+        width = max([n_samples] + [
+            len(point[SAMPLES_KEY]) for point in data.itervalues()])
+        store = cls(width, max(len(data), 1))
+        for hdg in sorted(data.keys()):
+            store[hdg] = data[hdg]
+        return store
+
+    # --Array access--
+    def column(self, key):
+        """Return a read-only view of the KEY values of every point in
+        pedestal heading order.
+        """
+        if key == SAMPLES_KEY:
+            return self.samples()
+        if key == COUNT_KEY:
+            return self.sample_counts()
+        view = self._columns[key][:self._n]
+        view.flags.writeable = False
+        return view
+
+    def samples(self):
+        """Return a read-only (n_points, max_samples) view of the samples,
+        padded with NaN where a point has fewer samples than the widest.
+        """
+        view = self._samples[:self._n, :self.sample_width()]
+        view.flags.writeable = False
+        return view
+
+    def sample_counts(self):
+        """Return the number of samples gathered for each point.
+        """
+        return self._counts[:self._n].copy()
+
+    def sample_width(self):
+        if self._n == 0:
+            return 0
+        return self._counts[:self._n].max()
+
+    def update_columns(self, values):
+        """Replace whole columns at once.  VALUES is a dictionary of
+        n_points arrays keyed by column name, in pedestal heading order.
+        """
+        for key, array in values.iteritems():
+            self._columns[key][:self._n] = array
+
+    # --Dictionary style access--
+    def _index(self, hdg):
+        pedestal = self._columns['pedestal_deg'][:self._n]
+        ii = np.searchsorted(pedestal, hdg)
+        if ii < self._n and pedestal[ii] == hdg:
+            return ii, True
+        return ii, False
+
+    def _grow(self, width):
+        capacity = self._capacity
+        if self._n == capacity:
+            capacity *= 2
+        old_width = self._samples.shape[1]
+        if capacity == self._capacity and width <= old_width:
+            return
+        for key in COLUMNS:
+            column = np.full(capacity, np.nan)
+            column[:self._n] = self._columns[key][:self._n]
+            self._columns[key] = column
+        samples = np.full((capacity, max(width, old_width)), np.nan)
+        samples[:self._n, :old_width] = self._samples[:self._n]
+        self._samples = samples
+        counts = np.zeros(capacity, dtype=int)
+        counts[:self._n] = self._counts[:self._n]
+        self._counts = counts
+        self._capacity = capacity
+
+    def __setitem__(self, hdg, point):
+        hdgs = np.asarray(point[SAMPLES_KEY], dtype=float)
+        ii, exists = self._index(hdg)
+        if not exists:
+            self._grow(len(hdgs))
+            # shift the following rows down to keep pedestal order
+            for key in COLUMNS:
+                column = self._columns[key]
+                column[ii+1:self._n+1] = column[ii:self._n].copy()
+            self._samples[ii+1:self._n+1] = self._samples[ii:self._n].copy()
+            self._counts[ii+1:self._n+1] = self._counts[ii:self._n].copy()
+            self._n += 1
+        elif len(hdgs) > self._samples.shape[1]:
+            self._grow(len(hdgs))
+        for key in COLUMNS:
+            self._columns[key][ii] = point.get(key, np.nan)
+        self._columns['pedestal_deg'][ii] = hdg
+        self._samples[ii] = np.nan
+        self._samples[ii, :len(hdgs)] = hdgs
+        self._counts[ii] = len(hdgs)
+
+    def __getitem__(self, hdg):
+        ii, exists = self._index(hdg)
+        if not exists:
+            raise KeyError(hdg)
+        point = dict(
+            (key, self._columns[key][ii].item()) for key in COLUMNS)
+        point['pedestal_deg'] = hdg
+        point[SAMPLES_KEY] = list(self._samples[ii, :self._counts[ii]])
+        point[COUNT_KEY] = self._counts[ii].item()
+        return point
+
+    def __delitem__(self, hdg):
+        ii, exists = self._index(hdg)
+        if not exists:
+            raise KeyError(hdg)
+        for key in COLUMNS:
+            column = self._columns[key]
+            column[ii:self._n-1] = column[ii+1:self._n].copy()
+        self._samples[ii:self._n-1] = self._samples[ii+1:self._n].copy()
+        self._counts[ii:self._n-1] = self._counts[ii+1:self._n].copy()
+        self._n -= 1
+
+    def __contains__(self, hdg):
+        return self._index(hdg)[1]
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        """Pedestal headings in sorted order.
+        """
+        return [hdg.item() for hdg in self._columns['pedestal_deg'][:self._n]]
+
+    def itervalues(self):
+        for hdg in self.keys():
+            yield self[hdg]
+
+    def iteritems(self):
+        for hdg in self.keys():
+            yield hdg, self[hdg]
+
+    # --Pickling keeps only the filled rows--
+    def __getstate__(self):
+        state = dict((key, self.column(key).copy()) for key in COLUMNS)
+        state['samples'] = self.samples().copy()
+        state['counts'] = self.sample_counts()
+        return state
+
+    def __setstate__(self, state):
+        n_points, width = state['samples'].shape
+        self.__init__(max(width, 1), max(n_points, 1))
+        self._n = n_points
+        for key in COLUMNS:
+            self._columns[key][:n_points] = state[key]
+        self._samples[:n_points, :width] = state['samples']
+        self._counts[:n_points] = state['counts']
@@ -0,0 +1,97 @@
+""" deviation.py
+Least squares fit of the classical compass deviation model
+
+    error(h) = A + B sin(h) + C cos(h) + D sin(2h) + E cos(2h)
+
+to the errors of a compass check, where h is the glider's true heading.
+A is a constant offset, B and C the one-cycle (hard iron) and D and E the
+two-cycle (soft iron) terms.
+"""
+import numpy as np
+
+TERMS = ('A', 'B', 'C', 'D', 'E')
+
+
+def design_matrix(headings_deg, n_terms=5):
+    """Return the (n_headings, N_TERMS) matrix of the model's terms
+    evaluated at HEADINGS_DEG.
+    """
+    rad = np.deg2rad(np.asarray(headings_deg, dtype=float))
+    columns = [np.ones_like(rad), np.sin(rad), np.cos(rad),
+               np.sin(2 * rad), np.cos(2 * rad)]
+    return np.column_stack(columns[:n_terms])
+
+
+class DeviationFit():
+    """The fitted deviation model of one compass check.  ``coefficients``
+    holds A to E in degrees (terms that could not be fitted for lack of
+    points are 0) and ``residuals`` the measured minus fitted errors.
+    """
+    def __init__(self, headings_deg, errors_deg):
+        headings_deg = np.asarray(headings_deg, dtype=float)
+        errors_deg = np.asarray(errors_deg, dtype=float)
+        self.n_points = len(headings_deg)
+        # each term needs a point; fit as many of them as there are points
+        self.n_terms = min(len(TERMS), self.n_points)
+        matrix = design_matrix(headings_deg, self.n_terms)
+        fitted = np.linalg.lstsq(matrix, errors_deg, rcond=None)[0]
+        self.coefficients = np.zeros(len(TERMS))
+        self.coefficients[:self.n_terms] = fitted
+        self.residuals = errors_deg - matrix.dot(fitted)
+        dof = self.n_points - self.n_terms
+        if dof > 0:
+            self.sigma = np.sqrt(np.sum(self.residuals ** 2) / dof)
+            self.covariance = self.sigma ** 2 * np.linalg.pinv(
+                matrix.T.dot(matrix))
+        else:
+            # an exact fit says nothing about the measurement noise
+            self.sigma = np.nan
+            self.covariance = np.full((self.n_terms, self.n_terms), np.nan)
+
+    def predict(self, headings_deg):
+        """Predicted compass error in degrees at HEADINGS_DEG.
+        """
+        return design_matrix(headings_deg).dot(self.coefficients)
+
+    def prediction_stderr(self, headings_deg):
+        """Standard error in degrees of the predicted error at
+        HEADINGS_DEG.
+        """
+        matrix = design_matrix(headings_deg, self.n_terms)
+        return np.sqrt(np.einsum(
+            'ij,jk,ik->i', matrix, self.covariance, matrix))
+
+    def rms_residual(self):
+        return np.sqrt(np.mean(self.residuals ** 2))
+
+    def max_error(self, step=1.):
+        """The largest predicted error magnitude around the compass and
+        the heading it occurs at, in degrees.
+        """
+        headings = np.arange(0., 360., step)
+        predicted = np.abs(self.predict(headings))
+        ii = np.argmax(predicted)
+        return predicted[ii], headings[ii]
+
+    def write_csv(self, path, header=''):
+        """Write the coefficients and fit statistics to a CSV file.
+        """
+        max_err, max_hdg = self.max_error()
+        with open(path, 'w') as fid:
+            if header:
+                fid.write(header + '\n\n')
+            fid.write('Model:,A + B sin(h) + C cos(h) + D sin(2h) + '
+                      'E cos(2h)\n')
+            for term, coefficient in zip(TERMS, self.coefficients):
+                fid.write('%s:,%.4f\n' % (term, coefficient))
+            fid.write('Points:,%d\n' % self.n_points)
+            fid.write('RMS Residual:,%.4f\n' % self.rms_residual())
+            fid.write('Max Predicted Error:,%.4f\n' % max_err)
+            fid.write('At Heading:,%.0f\n' % max_hdg)
+
+
+def fit_deviation(headings_deg, errors_deg):
+    """Fit the deviation model to the compass ERRORS_DEG measured at the
+    true HEADINGS_DEG.  Returns a DeviationFit.
+    """
+    return DeviationFit(headings_deg, errors_deg)
@@ -1,16 +1,16 @@
 #!/usr/bin/env python
 from dockserverTalk.dockserverTalk import ThreadedDockserverComm
 from dockserverTalk.dialogues import Buffer
-import re
+import Queue
+import threading
 import time
 
-# regex to grab the heading
-heading_regex = r'.+sensor: m_heading = (\d\.*\d*) rad'
-hdg_matcher = re.compile(heading_regex)
+from cc.errors import HeadingTimeoutException, ReadCancelledException
+from cc.sensor_parser import sensor_dict, parse_value
+from cc.pending import GliderConnection, ReadListeners, DEFAULT_TIMEOUT
 
-# regex to grab the magnetic variance
-mag_var_regex = r' = (-*\d+\.*\d+) rad'
-mv_matcher = re.compile(mag_var_regex)
+DOCKSERVER_PORT = 6564
+SENDER_ID = "compass-check;0x001cc"
 
 
 class ccBuffer(Buffer):
@@ -21,6 +21,8 @@ class ccBuffer(Buffer):
         # of the glider as identifier.
         self.glider=dockserverComm.gliderName
         self.MPQueue=dockserverComm.MPQueue
+        # reads started with read_headings_async etc. are fed from here
+        self.listeners=getattr(dockserverComm, 'listeners', None)
 
     # override the add method.
     def add(self,mesg):
@@ -35,24 +37,83 @@ class ccBuffer(Buffer):
             # We have something to write. Let's put it into the dockserver's
             # Message Passing Queue
             self.MPQueue.put((self.glider,mesg))
+            if self.listeners is not None:
+                self.listeners.dispatch(mesg)
 
 
-class dockserverCom():
+class DockserverPool():
+    """Dockserver sessions kept from one check to the next, for scripts
+    running several checks of a glider in one process without reconnecting
+    between them.  A dockserverTalk session follows a single glider, so
+    there is still a session (socket and thread) per host and glider,
+    started on first use; nothing is shared between gliders.  Close the
+    pool when done.
     """
-    """
-    def __init__(self, glidername, hostname, verbose=False, debug=False):
-        self.name = glidername
-        self.verbose = verbose
+    def __init__(self, comm_class=ThreadedDockserverComm,
+                 port=DOCKSERVER_PORT, senderID=SENDER_ID, debug=False):
+        self.comm_class = comm_class
+        self.port = port
+        self.senderID = senderID
         self.debug = debug
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, hostname, glidername):
+        """The running session to HOSTNAME following GLIDERNAME.
+        """
+        with self._lock:
+            dc = self._sessions.get((hostname, glidername))
+            if dc is None or not dc.isAlive():
+                dc = self.comm_class(
+                    hostname, glidername, self.port, self.senderID,
+                    debug=self.debug)
+                dc.listeners = ReadListeners()
+                dc.connect_bufferHandler(ccBuffer)
+                dc.start()
+                if not dc.isAlive():
+                    raise IOError("DockserverComm instance didn't start up.")
+                self._sessions[(hostname, glidername)] = dc
+            return dc
+
+    def close(self):
+        """End every session.
+        """
+        with self._lock:
+            sessions = self._sessions.values()
+            self._sessions = {}
+        for dc in sessions:
+            dc.terminate()
+        for dc in sessions:
+            dc.join()
+
+
+class dockserverCom(GliderConnection):
+    """Compass check connection to a glider through a dockserver.  Given a
+    DockserverPool, the pool's session is used and left running on exit.
+    """
+    def __init__(self, glidername, hostname, verbose=False, debug=False,
+                 timeout=DEFAULT_TIMEOUT, comm_class=ThreadedDockserverComm,
+                 pool=None):
+        GliderConnection.__init__(self, glidername, verbose, debug, timeout)
         self.hostname = hostname
-        self.port = 6564
-        self.senderID = "compass-check;0x001cc"
-        self.dc = ThreadedDockserverComm(
-            hostname, glidername, self.port, self.senderID, debug=self.debug)
-        self.dc.connect_bufferHandler(ccBuffer)
-        self.dc.start()
-        if not self.dc.isAlive():
-            raise IOError("DockserverComm instance didn't start up.")
+        self.pool = pool
+        if pool is not None:
+            self.port = pool.port
+            self.senderID = pool.senderID
+            self.dc = pool.session(hostname, glidername)
+            self.listeners = self.dc.listeners
+        else:
+            self.port = DOCKSERVER_PORT
+            self.senderID = SENDER_ID
+            self.dc = comm_class(
+                hostname, glidername, self.port, self.senderID,
+                debug=self.debug)
+            self.dc.listeners = self.listeners = ReadListeners()
+            self.dc.connect_bufferHandler(ccBuffer)
+            self.dc.start()
+            if not self.dc.isAlive():
+                raise IOError("DockserverComm instance didn't start up.")
+        self.queue = self.dc.MPQueue
         if self.verbose:
             print 'Connected to Dockserver', self.hostname
         # want to verify the glider config here?
@@ -69,66 +130,80 @@ class dockserverCom():
     def flush(self):
         """
         """
-        self.dc.MPQueue.queue.clear()
-        if self.dc.MPQueue.empty():
+        self.queue.queue.clear()
+        if self.queue.empty():
             return True
 
-    def read_headings(self, count=10):
-        """
+    def cancel(self):
+        """Abort a ``read_headings`` or ``get_mag_var`` call waiting in
+        another thread.  The waiting call raises ReadCancelledException.
         """
-        headings = []
-        line_count = 0
-        if self.verbose:
-            print 'Gathering %d headings.' % count
-        # flush buffer so headings aren't old
-        flushed = self.flush()
-        while flushed:
-            if not self.dc.MPQueue.empty():
-                while not self.dc.MPQueue.empty():
-                    gliderName, mesg = self.dc.MPQueue.get_nowait()
-                    print mesg.rstrip()
-                    match_hdg = hdg_matcher.match(mesg)
-                    if match_hdg:
-                        hdg = float(match_hdg.group(1))
-                        headings.append(hdg)
-                        line_count += 1
-            else:
-                time.sleep(0.5)
-            if line_count >= count:
-                break
-        return headings
+        self._cancelled.set()
+        # wake up the blocked consumer straight away
+        self.queue.put((None, None))
 
-    def get_mag_var(self, try_lines=3):
+    def _next_item(self, deadline):
+        """Block until the next line from the glider arrives or DEADLINE
+        (a time.time() value) passes.  Returns the line and the {name:
+        value} dictionary of any sensor values reported on it, or (None,
+        None) on timeout.
         """
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None, None
+            try:
+                gliderName, mesg = self.queue.get(timeout=remaining)
+            except Queue.Empty:
+                return None, None
+            if self._cancelled.is_set():
+                raise ReadCancelledException(
+                    'Reading from glider %s cancelled.' % self.name)
+            if mesg is not None:
+                sensors = sensor_dict(mesg)
+                self.sensors.update(sensors)
+                return mesg, sensors
+
+    def get_mag_var(self, try_lines=3, timeout=None):
+        """Request m_gps_mag_var from the glider and return the magnetic
+        declination in radians, unless the glider has already reported it in
+        its output.  The command is re-sent every TRY_LINES lines without a
+        reply.
         """
-        # flush queue buffer
-        match_mv = None
-        tries = 0
-        flushed = self.flush()
-        while not match_mv:
+        if 'm_gps_mag_var' in self.sensors:
+            # already reported alongside the headings, no need to ask
+            return -self.sensors['m_gps_mag_var']
+        if timeout is None:
+            timeout = self.timeout
+        self.flush()
+        self._cancelled.clear()
+        deadline = time.time() + timeout
+        while True:
             self.write('get m_gps_mag_var')
             tries = 0
             while tries <= try_lines:
-                if not self.dc.MPQueue.empty():
-                    while not self.dc.MPQueue.empty():
-                        gliderName, mesg = self.dc.MPQueue.get_nowait()
-                        if self.verbose:
-                            print mesg.rstrip()
-                        match_mv = mv_matcher.match(mesg)
-                        tries += 1
-                        if match_mv:
-                            if self.verbose:
-                                print 'Matched mag var'
-                            mag_var = float(match_mv.group(1))
-                            return -mag_var
-                else:
-                    # Sleep to not overrun CPU cycles
-                    time.sleep(0.1)
-        return -mag_var
+                mesg = self._next_line(deadline)
+                if mesg is None:
+                    raise HeadingTimeoutException(
+                        'No m_gps_mag_var reply from %s in %.0f s.'
+                        % (self.name, timeout))
+                if self.verbose:
+                    print mesg.rstrip()
+                mag_var = parse_value(mesg, 'm_gps_mag_var')
+                tries += 1
+                if mag_var is not None:
+                    if self.verbose:
+                        print 'Matched mag var'
+                    return -mag_var  # the gliders handle mag_var negatively
 
     def close(self):
-        """An interactive method to close the dockserver connection
+        """An interactive method to close the dockserver connection, or to
+        hand a pooled one back to its pool
         """
+        if self.pool is not None:
+            # nothing of this check may be fed by the session from now on
+            self.listeners.clear()
+            return
         self.dc.terminate()
         self.dc.join()
 
@@ -141,8 +216,7 @@ class dockserverCom():
         """Exit code used in a ``with`` statement
         """
         self.flush()
-        self.dc.terminate()
-        self.dc.join()
+        self.close()
         if self.verbose:
             print 'Exited Gracefully!'
 
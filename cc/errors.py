@@ -0,0 +1,19 @@
+""" errors.py
+Exceptions shared by the glider communication classes (serial RF and
+dockserver).
+"""
+from exceptions import Exception
+
+
+class HeadingTimeoutException(Exception):
+    """Raised when the glider does not report the requested number of
+    values before the timeout expires.  The values gathered so far are kept
+    in the ``headings`` attribute.
+    """
+    def __init__(self, message, headings=None):
+        Exception.__init__(self, message)
+        self.headings = headings or []
+
+
+class ReadCancelledException(Exception):
+    pass
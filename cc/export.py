@@ -0,0 +1,66 @@
+""" export.py
+Export formats for compass check results besides the original transposed
+CSV file.
+
+``long`` is a tidy table with one row per compass sample, holding the
+sample in degrees alongside the values of its compass point, so every
+point is also there (once per sample).  ``npz`` is the columnar NumPy
+archive of cc.archive holding just this check.  Both are written from the
+check's arrays in one call, without formatting values one at a time.
+"""
+import numpy as np
+
+from cc.archive import write_archive
+
+# formats selectable with --format; 'csv' is the transposed CSV file
+FORMATS = ('csv', 'long', 'npz')
+
+# long table columns taken from the check's points, and their formats
+LONG_COLUMNS = (
+    ('pedestal_deg', '%d'),
+    ('glider_true_deg', '%d'),
+    ('compass_mag_deg', '%.2f'),
+    ('compass_true_deg', '%.2f'),
+    ('compass_std_deg', '%.2f'),
+    ('n_samples', '%d'),
+    ('error', '%.2f'))
+
+
+def long_table(check):
+    """The (n_samples_total, n_columns) array of the long table of CHECK
+    (an ArchivedCheck): the LONG_COLUMNS values of each sample's point, the
+    sample number within the point and the sample in degrees.  Missing
+    samples are left out.
+    """
+    samples = check.samples
+    taken = ~np.isnan(samples)
+    rows, sample_no = np.nonzero(taken)
+    point_values = np.column_stack(
+        [np.asarray(check.column(key), dtype=float)
+         for key, col_fmt in LONG_COLUMNS])
+    return np.column_stack([
+        point_values[rows], sample_no + 1,
+        np.rad2deg(samples[taken]) % 360.])
+
+
+def write_long_csv(path, check):
+    """Write the long table of CHECK, with a header row, to PATH.  The
+    glider, date and time are repeated on each row so tables of several
+    checks can simply be concatenated.
+    """
+    # the constant columns are written as part of the format
+    prefix = ','.join([check.glider, check.date, check.time or ''])
+    fmt = ','.join(
+        [prefix] + [col_fmt for key, col_fmt in LONG_COLUMNS] +
+        ['%d', '%.2f'])
+    header = ','.join(
+        ['glider', 'date', 'time'] +
+        [key for key, col_fmt in LONG_COLUMNS] + ['sample', 'sample_deg'])
+    np.savetxt(path, long_table(check), fmt=fmt, header=header,
+               comments='')
+
+
+def write_npz(path, check):
+    """Write CHECK as a one-check columnar archive (see cc.archive).
+    """
+    write_archive(path, [check])
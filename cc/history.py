@@ -0,0 +1,214 @@
+""" history.py
+Fleet-wide history of compass checks in an embedded SQLite database.
+
+Every check written by compass_check adds one ``checks`` row (glider, date,
+time, settings and the fitted deviation coefficients) and a ``points`` row
+for each of its compass points.  Both tables are indexed by glider and date,
+and the points also by glider and heading, so the drift of one glider's
+compass or the state of the whole fleet can be looked up without reading
+any CSV files.  A check recorded again (same glider, date and time) replaces
+the earlier record.
+"""
+import os
+import os.path
+import sqlite3
+
+import numpy as np
+
+from cc.deviation import TERMS, design_matrix
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cc', 'history.sqlite')
+
+# per-point columns recorded, and the CompassStore column each comes from
+POINT_COLUMNS = (
+    ('pedestal_deg', 'pedestal_deg'),
+    ('glider_true_deg', 'glider_true_deg'),
+    ('compass_mag_deg', 'compass_mag_deg'),
+    ('compass_true_deg', 'compass_true_deg'),
+    ('compass_std_deg', 'compass_std_deg'),
+    ('n_samples', 'n_samples'),
+    ('error_deg', 'error'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY,
+    glider TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    offset_deg REAL,
+    declination_deg REAL,
+    n_points INTEGER,
+    %(terms)s,
+    rms_residual REAL,
+    max_error REAL,
+    max_error_heading REAL,
+    source TEXT,
+    UNIQUE (glider, date, time)
+);
+CREATE INDEX IF NOT EXISTS checks_glider_date ON checks (glider, date);
+CREATE INDEX IF NOT EXISTS checks_date ON checks (date);
+CREATE TABLE IF NOT EXISTS points (
+    check_id INTEGER NOT NULL REFERENCES checks (id) ON DELETE CASCADE,
+    glider TEXT NOT NULL,
+    date TEXT NOT NULL,
+    %(points)s
+);
+CREATE INDEX IF NOT EXISTS points_check ON points (check_id);
+CREATE INDEX IF NOT EXISTS points_glider_date ON points (glider, date);
+CREATE INDEX IF NOT EXISTS points_glider_heading
+    ON points (glider, glider_true_deg);
+""" % {
+    'terms': ',\n    '.join('%s REAL' % term for term in TERMS),
+    'points': ',\n    '.join('%s REAL' % name for name, key in POINT_COLUMNS)}
+
+CHECK_FIELDS = (
+    ('id', 'glider', 'date', 'time', 'offset_deg', 'declination_deg',
+     'n_points') + TERMS +
+    ('rms_residual', 'max_error', 'max_error_heading', 'source'))
+
+
+class HistoryDB():
+    """The compass check history database at PATH (by default
+    ~/.cc/history.sqlite), created on first use.  Query results are lists of
+    dictionaries keyed by column name.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = DEFAULT_PATH
+        drctry = os.path.dirname(path)
+        if drctry and not os.path.exists(drctry):
+            os.makedirs(drctry)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.close()
+
+    def add_check(self, glider, tstamp, offset_deg, declination_deg, data,
+                  fit=None, source=None):
+        """Record the compass check of GLIDER started at TSTAMP (a
+        datetime) with its CompassStore DATA, deviation FIT and the name of
+        the SOURCE file, replacing any earlier record of the same check.
+        Returns the check's id.
+        """
+        date = tstamp.strftime('%Y-%m-%d')
+        time = tstamp.strftime('%H:%M')
+        coefficients = [None] * len(TERMS)
+        rms = max_err = max_hdg = None
+        if fit is not None:
+            coefficients = [float(value) for value in fit.coefficients]
+            rms = float(fit.rms_residual())
+            max_err, max_hdg = [float(value) for value in fit.max_error()]
+        columns = [data.column(key) for name, key in POINT_COLUMNS]
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM checks WHERE glider = ? AND date = ? AND '
+                'time = ?', (glider, date, time))
+            cursor = self.conn.execute(
+                'INSERT INTO checks (%s) VALUES (%s)' % (
+                    ', '.join(CHECK_FIELDS[1:]),
+                    ', '.join('?' * (len(CHECK_FIELDS) - 1))),
+                [glider, date, time, offset_deg, declination_deg, len(data)] +
+                coefficients + [rms, max_err, max_hdg, source])
+            check_id = cursor.lastrowid
+            self.conn.executemany(
+                'INSERT INTO points (check_id, glider, date, %s) '
+                'VALUES (?, ?, ?, %s)' % (
+                    ', '.join(name for name, key in POINT_COLUMNS),
+                    ', '.join('?' * len(POINT_COLUMNS))),
+                ([check_id, glider, date] + [float(col[ii]) for col in columns]
+                 for ii in range(len(data))))
+        return check_id
+
+    def _query(self, sql, args=()):
+        return [dict(row) for row in self.conn.execute(sql, args)]
+
+    def checks(self, glider=None, since=None, until=None):
+        """The recorded checks, oldest first, optionally only those of
+        GLIDER and/or dated between SINCE and UNTIL ('YYYY-MM-DD',
+        inclusive).
+        """
+        where, args = [], []
+        if glider is not None:
+            where.append('glider = ?')
+            args.append(glider)
+        if since is not None:
+            where.append('date >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('date <= ?')
+            args.append(until)
+        sql = 'SELECT * FROM checks'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self._query(sql + ' ORDER BY date, time, glider', args)
+
+    def points(self, check_id):
+        """The compass points of one check, by pedestal heading.
+        """
+        return self._query(
+            'SELECT * FROM points WHERE check_id = ? ORDER BY pedestal_deg',
+            (check_id,))
+
+    def gliders(self):
+        return [row['glider'] for row in self._query(
+            'SELECT DISTINCT glider FROM checks ORDER BY glider')]
+
+    def latest(self, since=None):
+        """The most recent check of each glider (checked since SINCE, if
+        given), by glider name.
+        """
+        sql = ("SELECT c.* FROM checks c JOIN ("
+               "SELECT glider, MAX(date || ' ' || time) AS last "
+               "FROM checks %s GROUP BY glider) l "
+               "ON c.glider = l.glider AND c.date || ' ' || c.time = l.last "
+               "ORDER BY c.glider")
+        if since is not None:
+            return self._query(sql % 'WHERE date >= ?', (since,))
+        return self._query(sql % '')
+
+    def drift(self, glider, headings_deg=(0, 90, 180, 270), since=None,
+              until=None):
+        """The checks of GLIDER, oldest first, each with the error its
+        fitted deviation curve predicts at HEADINGS_DEG added as
+        ``predicted`` (a list in the same order).  Changes in the predicted
+        errors from check to check show how the compass has drifted.
+        """
+        matrix = design_matrix(headings_deg)
+        rows = self.checks(glider, since, until)
+        for row in rows:
+            coefficients = np.array(
+                [row[term] for term in TERMS], dtype=float)
+            row['predicted'] = list(matrix.dot(coefficients))
+        return rows
+
+    def errors_near(self, heading_deg, glider=None, within_deg=5.,
+                    since=None):
+        """The measured points within WITHIN_DEG of the true HEADING_DEG,
+        of GLIDER or the whole fleet, oldest first.
+        """
+        low, high = heading_deg - within_deg, heading_deg + within_deg
+        # headings near north wrap around 0/360
+        where = ['(glider_true_deg BETWEEN ? AND ? OR '
+                 'glider_true_deg BETWEEN ? AND ? OR '
+                 'glider_true_deg BETWEEN ? AND ?)']
+        args = [low, high, low + 360, high + 360, low - 360, high - 360]
+        if glider is not None:
+            where.append('p.glider = ?')
+            args.append(glider)
+        if since is not None:
+            where.append('p.date >= ?')
+            args.append(since)
+        return self._query(
+            'SELECT p.*, c.time FROM points p JOIN checks c '
+            'ON p.check_id = c.id WHERE %s ORDER BY p.date, c.time, p.glider'
+            % ' AND '.join(where), args)
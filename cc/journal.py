@@ -0,0 +1,94 @@
+""" journal.py
+Append-only session journal that persists a compass check point by point.
+
+Each record is one line of JSON, flushed and fsync'd as soon as it is
+written, so saving a point costs the same no matter how many points came
+before it and a crash loses at most the record being written.  A ``header``
+record holds the session settings (offset, magnetic declination, ...); a
+later header replaces an earlier one.  ``point`` records hold a pedestal
+heading and its raw compass samples; a later point for the same pedestal
+heading replaces the earlier one.
+"""
+import json
+import os
+
+
+class SessionJournal():
+    """Reads and appends the records of one session's journal file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fid = None
+
+    def _append(self, record):
+        if self._fid is None:
+            self._fid = open(self.path, 'a')
+        self._fid.write(json.dumps(record) + '\n')
+        self._fid.flush()
+        os.fsync(self._fid.fileno())
+
+    def write_header(self, **settings):
+        record = {'type': 'header'}
+        record.update(settings)
+        self._append(record)
+
+    def write_point(self, pedestal_deg, samples, **extra):
+        record = {
+            'type': 'point', 'pedestal_deg': pedestal_deg,
+            'samples': [float(hdg) for hdg in samples]}
+        record.update(extra)
+        self._append(record)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def replay(self):
+        """Scan the journal and return (header, points), where header is
+        the latest header record (or None) and points a dictionary of the
+        latest point record for each pedestal heading.  An incomplete last
+        line, left by a crash mid-write, is ignored.
+        """
+        header = None
+        points = {}
+        with open(self.path, 'r') as fid:
+            for line in fid:
+                if not line.endswith('\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'header':
+                    header = record
+                elif record.get('type') == 'point':
+                    points[record['pedestal_deg']] = record
+        return header, points
+
+    def compact(self):
+        """Rewrite the journal holding only the latest header and one record
+        per pedestal heading.  The new file replaces the old one atomically.
+        """
+        header, points = self.replay()
+        self.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fid:
+            if header is not None:
+                fid.write(json.dumps(header) + '\n')
+            for hdg in sorted(points.keys()):
+                fid.write(json.dumps(points[hdg]) + '\n')
+            fid.flush()
+            os.fsync(fid.fileno())
+        os.rename(tmp_path, self.path)
+        return header, points
+
+    def close(self):
+        if self._fid is not None:
+            self._fid.close()
+            self._fid = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,264 @@
+""" live.py
+A live terminal view of compass checks for slow consoles (RF laptops,
+remote ssh sessions), where printing is a real part of the time a check
+takes.
+
+Each glider's table of points is pinned to the top of the terminal and the
+rest of the terminal scrolls beneath it as usual.  Only the cells whose
+text has changed are rewritten, e.g. a new point's column or the running
+values of the point being read, so a point costs a few dozen characters
+rather than a reprint of every point.  The glider's raw output can be
+thinned out to a line every few seconds, or only written to a log file,
+with a LineEcho.
+"""
+import struct
+import sys
+import threading
+import time
+
+# width of a point's column, as in compass_check's tables
+CELL_WIDTH = 7
+
+BOLD = '\x1b[1m'
+NORMAL = '\x1b[0m'
+
+
+def terminal_size(out=None):
+    """The (lines, columns) of the terminal OUT (by default whatever
+    sys.stdout is at the time) writes to, or (24, 80).
+    """
+    out = out or sys.stdout
+    try:
+        # not on Windows
+        import fcntl
+        import termios
+        lines, columns = struct.unpack(
+            'hh', fcntl.ioctl(out.fileno(), termios.TIOCGWINSZ, '1234'))
+    except (ImportError, IOError, AttributeError, ValueError):
+        return 24, 80
+    return lines or 24, columns or 80
+
+
+def echo_interval(value):
+    """The LineEcho interval meant by VALUE, an --echo option: 'all'
+    (every line, 0), 'none' (None) or a number of seconds.
+    """
+    if value == 'all':
+        return 0.
+    if value == 'none':
+        return None
+    interval = float(value)
+    if interval < 0:
+        raise ValueError('negative echo interval %s' % value)
+    return interval
+
+
+class LineEcho():
+    """Echoes lines of raw glider output: every line with INTERVAL 0, at
+    most one line every INTERVAL seconds (with the number of lines left
+    out), or none with INTERVAL None.  Every line is also written to the
+    file LOG_PATH, if given.  Lines are echoed to OUT, by default whatever
+    sys.stdout is at the time, as ``print`` did.
+    """
+    def __init__(self, interval=0., log_path=None, out=None):
+        self.interval = interval
+        self.out = out
+        self.log = None
+        if log_path:
+            self.log = open(log_path, 'a')
+        self.skipped = 0
+        self._last = 0.
+
+    def __call__(self, line):
+        line = line.rstrip()
+        if self.log is not None:
+            self.log.write(line + '\n')
+        if self.interval is None:
+            return
+        if self.interval:
+            now = time.time()
+            if now - self._last < self.interval:
+                self.skipped += 1
+                return
+            self._last = now
+            if self.skipped:
+                line = '%s  (%d lines not shown)' % (line, self.skipped)
+                self.skipped = 0
+        # one write, so it cannot be split by the live view's writes
+        (self.out or sys.stdout).write(line + '\n')
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+class PointProgress():
+    """Passes the headings of the point being read to CALLBACK as they
+    arrive, e.g. to show the running mean and error.  Register it with a
+    glider connection's ``listeners``; it stays registered until ``stop``.
+    """
+    def __init__(self, callback):
+        self.callback = callback
+        self.headings = []
+        self.active = True
+
+    def feed(self, line, sensors):
+        if not self.active:
+            return True
+        heading = sensors.get('m_heading')
+        if heading is not None:
+            self.headings.append(heading)
+            self.callback(list(self.headings))
+        return False
+
+    def stop(self):
+        self.active = False
+
+
+class LiveView():
+    """The terminal OUT (by default whatever sys.stdout is when the view is
+    made), with the tables added pinned to its top and the lines below them
+    scrolling.
+    """
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.tables = []
+        self.active = False
+        self.lock = threading.RLock()
+        self.lines, self.columns = terminal_size(out)
+
+    def add_table(self, title, row_info):
+        """Add a table of points titled TITLE, with rows of ROW_INFO
+        (header, format, key) tuples, below the tables already added.
+        """
+        table = LiveTable(self, title, row_info, self.height() + 1)
+        self.tables.append(table)
+        return table
+
+    def height(self):
+        return sum(table.height for table in self.tables)
+
+    def start(self):
+        """Clear the terminal and pin the tables to its top.  Returns
+        False, leaving the view inactive, when OUT is not a terminal or the
+        tables do not leave a few lines to scroll.
+        """
+        if not self.out.isatty() or self.height() + 5 > self.lines:
+            return False
+        with self.lock:
+            # clear, limit scrolling to the lines below the tables and
+            # move to the first of those
+            self.out.write('\x1b[2J\x1b[%d;%dr\x1b[%d;1H' % (
+                self.height() + 1, self.lines, self.height() + 1))
+            self.active = True
+            for table in self.tables:
+                table.redraw()
+        return True
+
+    def stop(self):
+        """Let the whole terminal scroll again, leaving the tables on it.
+        """
+        if not self.active:
+            return
+        with self.lock:
+            self.active = False
+            self.out.write('\x1b[r\x1b[%d;1H\n' % self.lines)
+            self.out.flush()
+
+    def write_cells(self, cells):
+        """Write each (line, column, text) of CELLS, 1 based screen
+        positions, and put the cursor back where it was.
+        """
+        if not cells:
+            return
+        self.out.write('\x1b7%s\x1b8' % ''.join(
+            '\x1b[%d;%dH%s' % cell for cell in cells))
+        self.out.flush()
+
+
+class LiveTable():
+    """A glider's table of points in a LiveView, starting on line TOP.
+    Point columns are only rewritten when their text changes; when there
+    are more points than fit across the terminal the last ones are shown.
+    """
+    def __init__(self, view, title, row_info, top):
+        self.view = view
+        self.title = title
+        self.row_info = row_info
+        self.top = top
+        # the title, a line per row and a blank line
+        self.height = len(row_info) + 2
+        self.label_width = max(len(header) for header, fmt, key in row_info)
+        self._shown = {}
+        self._last = ('', [], None)
+
+    def n_points(self):
+        """The number of point columns that fit across the terminal.
+        """
+        return max((self.view.columns - self.label_width) // CELL_WIDTH, 1)
+
+    def cells(self, subtitle, points, current=None):
+        """The text of every cell, by (table line, screen column), of the
+        table of POINTS (dictionaries of the row keys' values, in order) and
+        the CURRENT point being read, in bold, if any.
+        """
+        width = self.view.columns - 1
+        cells = {(0, 1): ('%s  %s' % (self.title, subtitle))[
+            :width].ljust(width)}
+        for ii, (header, fmt, key) in enumerate(self.row_info):
+            cells[(ii + 1, 1)] = header.rjust(self.label_width)
+        shown = list(points)
+        if current is not None:
+            # pedestal headings are kept sorted, as in the saved points
+            shown = [point for point in shown
+                     if point['pedestal_deg'] != current['pedestal_deg']]
+            shown.append(current)
+            shown.sort(key=lambda point: point['pedestal_deg'])
+        shown = shown[-self.n_points():]
+        for jj, point in enumerate(shown):
+            column = self.label_width + 1 + jj * CELL_WIDTH
+            for ii, (header, fmt, key) in enumerate(self.row_info):
+                value = point.get(key)
+                if value is None or value != value:
+                    text = ' ' * CELL_WIDTH
+                else:
+                    text = ' ' + fmt % value
+                if point is current:
+                    text = BOLD + text + NORMAL
+                cells[(ii + 1, column)] = text
+        return cells
+
+    def update(self, subtitle, points, current=None):
+        """Show the table of POINTS and the CURRENT point (see ``cells``),
+        rewriting only the cells that have changed.
+        """
+        with self.view.lock:
+            self._last = (subtitle, points, current)
+            if not self.view.active:
+                return
+            cells = self.cells(subtitle, points, current)
+            changed = [
+                (self.top + line, column, text)
+                for (line, column), text in sorted(cells.iteritems())
+                if self._shown.get((line, column)) != text]
+            # blank out cells no longer used, e.g. a shorter title
+            for (line, column), text in self._shown.iteritems():
+                if (line, column) not in cells:
+                    changed.append((self.top + line, column, ' ' * len(
+                        text.replace(BOLD, '').replace(NORMAL, ''))))
+            self.view.write_cells(changed)
+            self._shown = cells
+
+    def redraw(self):
+        """Write every cell again, e.g. after other output has garbled
+        the table.
+        """
+        with self.view.lock:
+            self._shown = {}
+            if self.view.active:
+                # blank the table's lines first
+                self.view.write_cells([
+                    (self.top + line, 1, '\x1b[2K')
+                    for line in range(self.height)])
+            self.update(*self._last)
@@ -8,13 +8,16 @@ Check program.
 
 parser = optparse.OptionParser(
     usage=(
-        "\n    Dockserver: %prog [options] hostname glidername\n"
-        "   Serial Port: %prog [options] -s port glidername"),
+        "\n    Dockserver: %prog [options] hostname glidername [glidername ...]\n"
+        "   Serial Port: %prog [options] -s port[,port ...] glidername "
+        "[glidername ...]"),
     description=(
         """Glider Compass Accuracy Check: Performs a glider compass accuracy
         check by comparing the internal compass heading to known true headings.
         compass_check can communicate over either a dockserver connection
-        (default), or a serial port with a Freewave modem connected. For full
+        (default), or a serial port with a Freewave modem connected. Several
+        gliders can be checked at once by giving more than one glidername
+        (and, for serial ports, a comma separated port for each). For full
         instructions view the README.TXT file that came with this program."""))
 
 parser.add_option(
@@ -53,6 +56,163 @@ parser.add_option(
     action='store',
     type=float)
 
+parser.add_option(
+    "-t", "--timeout",
+    help=(
+        "Maximum number of seconds to wait for the glider to report the "
+        "headings for a single compass point (default 60)."),
+    dest="timeout",
+    default=60.,
+    action='store',
+    type=float)
+
+parser.add_option(
+    "--schedule",
+    help=(
+        "Run unattended using the pedestal headings, settle time, samples "
+        "per point, offset, declination and optional turntable command in "
+        "this JSON schedule file (see cc/schedule.py)."),
+    dest="schedule",
+    default=None,
+    action='store')
+
+parser.add_option(
+    "--capture",
+    help=(
+        "Record the raw glider output of every compass point to a .cap "
+        "file next to the results, for reprocessing with compass_replay.py."),
+    dest="capture",
+    default=False,
+    action='store_true')
+
+parser.add_option(
+    "-n", "--samples",
+    help=(
+        "Number of compass headings taken at each point (default 10).  In "
+        "streaming mode, the most taken at each point."),
+    dest="samples",
+    default=10,
+    action='store',
+    type=int)
+
+parser.add_option(
+    "--stream",
+    help=(
+        "Streaming mode: rather than a fixed number of headings, watch a "
+        "rolling window of headings and take the point as soon as they "
+        "settle (spread below --settle degrees, after at least "
+        "--min-samples).  One glider only."),
+    dest="stream",
+    default=False,
+    action='store_true')
+
+parser.add_option(
+    "--settle",
+    help=(
+        "Circular standard deviation in degrees below which the headings "
+        "count as settled in streaming mode (default 0.5)."),
+    dest="settle_deg",
+    default=0.5,
+    action='store',
+    type=float)
+
+parser.add_option(
+    "--target-stderr",
+    help=(
+        "Adaptive sampling: keep taking headings at each point until the "
+        "standard error of their mean is below this many degrees (at "
+        "least --min-samples, at most --samples headings).  One glider "
+        "only."),
+    dest="target_stderr",
+    default=None,
+    action='store',
+    type=float)
+
+parser.add_option(
+    "--min-samples",
+    help=(
+        "Fewest headings taken at each point with --stream or "
+        "--target-stderr (default 5, at most --samples)."),
+    dest="min_samples",
+    default=5,
+    action='store',
+    type=int)
+
+parser.add_option(
+    "--tolerance",
+    help=(
+        "Largest acceptable compass error in degrees.  Suggests the next "
+        "pedestal heading to take and says when enough points have been "
+        "taken to pass or fail the compass."),
+    dest="tolerance",
+    default=None,
+    action='store',
+    type=float)
+
+parser.add_option(
+    "--format",
+    help=(
+        "Comma separated result file formats: csv (the transposed CSV "
+        "file), long (a CSV table with one row per compass sample, "
+        "<name>_long.csv) and/or npz (NumPy arrays, <name>.npz).  "
+        "Default: csv."),
+    dest="formats",
+    default='csv',
+    action='store')
+
+parser.add_option(
+    "--history",
+    help=(
+        "History database the results are added to (default: "
+        "~/.cc/history.sqlite).  Query it with compass_history.py."),
+    dest="history",
+    default=None,
+    action='store')
+
+parser.add_option(
+    "--no-history",
+    help="Do not add the results to the history database.",
+    dest="no_history",
+    default=False,
+    action='store_true')
+
+parser.add_option(
+    "--profile",
+    help=(
+        "Write the time taken by each stage of every compass point to "
+        "<name>_timing.json and a Python profile of the session to "
+        "<name>.prof (view with python -m pstats)."),
+    dest="profile",
+    default=False,
+    action='store_true')
+
+parser.add_option(
+    "--live",
+    help=(
+        "Keep each glider's table of points at the top of the terminal, "
+        "updating only the values that change (including those of the "
+        "point being read) rather than printing every point."),
+    dest="live",
+    default=False,
+    action='store_true')
+
+parser.add_option(
+    "--echo",
+    help=(
+        "Glider output shown while reading a point: all, none, or at most "
+        "one line every this many seconds (default: all, or 2 with "
+        "--live)."),
+    dest="echo",
+    default=None,
+    action='store')
+
+parser.add_option(
+    "--echo-log",
+    help="Also append all of the glider output read to this file.",
+    dest="echo_log",
+    default=None,
+    action='store')
+
 parser.add_option(
     "-v",
     help="Verbosity.  Explicitly print program actions.",
@@ -0,0 +1,298 @@
+""" pending.py
+Non-blocking reads of glider sensor values.
+
+A PendingRead is registered with a glider connection and is completed by
+that connection's reader thread as lines arrive, so no thread has to sit
+waiting on each connection.  A single thread can start reads on many
+gliders and collect the results as they finish with a ReadGroup::
+
+    group = ReadGroup()
+    for glider in gliders:
+        group.add(glider.read_headings_async(10))
+    for read in group.as_completed():
+        headings = read.result()
+
+GliderConnection holds the reads, blocking or not, that the serial RF and
+dockserver connections have in common.
+"""
+import Queue
+import threading
+import time
+
+from cc.errors import HeadingTimeoutException, ReadCancelledException
+from cc.sensor_parser import sensor_dict, parse_value
+from cc.timing import StageTimer
+from cc.live import LineEcho
+
+# default number of seconds to wait for a compass point before giving up
+DEFAULT_TIMEOUT = 60.
+
+
+class PendingRead():
+    """Collects COUNT values of SENSOR from a glider's output.  With COUNT
+    None a single value is collected and ``result`` returns it on its own
+    rather than in a list.  BARE_REPLY also accepts the `` = VALUE UNIT``
+    reply to a ``get SENSOR`` command, and SIGN multiplies every value.
+    """
+    def __init__(self, glidername, sensor, count=None, timeout=60.,
+                 bare_reply=False, sign=1):
+        self.glidername = glidername
+        self.sensor = sensor
+        self.count = count
+        self.timeout = timeout
+        # when the read started, its first value arrived and it finished,
+        # and the lines offered to it, for stage timing (see cc.timing)
+        self.started = time.time()
+        self.first_at = None
+        self.finished_at = None
+        self.n_lines = 0
+        self.deadline = self.started + timeout
+        self.bare_reply = bare_reply
+        self.sign = sign
+        self.values = []
+        self.completions = None
+        self._error = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def feed(self, line, sensors):
+        """Offer a line of glider output (and its parsed SENSORS dictionary)
+        to the read.  Called by the reader thread; returns True once the read
+        is complete and no longer needs lines.
+        """
+        if self._done.is_set():
+            return True
+        self.n_lines += 1
+        value = sensors.get(self.sensor)
+        if value is None and self.bare_reply:
+            value = parse_value(line, self.sensor)
+        if value is not None:
+            if not self.values:
+                self.first_at = time.time()
+            self.values.append(self.sign * value)
+            if len(self.values) >= (self.count or 1):
+                self._finish()
+        elif time.time() > self.deadline:
+            self.expire()
+        return self._done.is_set()
+
+    def _finish(self, error=None):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._error = error
+            self.finished_at = time.time()
+            self._done.set()
+        if self.completions is not None:
+            self.completions.put(self)
+
+    def expire(self):
+        """Fail the read with HeadingTimeoutException if it is overdue.
+        """
+        if time.time() >= self.deadline:
+            self._finish(HeadingTimeoutException(
+                'Only %d of %d %s values received from %s in %.0f s.'
+                % (len(self.values), self.count or 1, self.sensor,
+                   self.glidername, self.timeout), self.values))
+
+    def cancel(self):
+        self._finish(ReadCancelledException(
+            'Reading from glider %s cancelled.' % self.glidername))
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the read to finish, at most until its deadline (or
+        TIMEOUT seconds if given), and return the values collected.
+        """
+        if timeout is None:
+            timeout = self.deadline - time.time()
+        self._done.wait(max(timeout, 0))
+        self.expire()
+        if not self._done.is_set():
+            raise HeadingTimeoutException(
+                'Read from %s still in progress.' % self.glidername,
+                self.values)
+        if self._error is not None:
+            raise self._error
+        if self.count is None:
+            return self.values[0]
+        return self.values
+
+
+class ReadListeners():
+    """The reads waiting on one glider connection's output.  The
+    connection's reader thread passes every line to ``dispatch``.  Anything
+    with a ``feed(line, sensors)`` method (e.g. a capture.CaptureWriter) can
+    be added.
+    """
+    def __init__(self):
+        self._reads = []
+        self._lock = threading.Lock()
+
+    def add(self, read):
+        with self._lock:
+            self._reads.append(read)
+        return read
+
+    def clear(self):
+        with self._lock:
+            self._reads = []
+
+    def dispatch(self, line, sensors=None):
+        if not self._reads:
+            return
+        if sensors is None:
+            sensors = sensor_dict(line)
+        with self._lock:
+            self._reads = [
+                read for read in self._reads if not read.feed(line, sensors)]
+
+
+class GliderConnection():
+    """A connection to glider GLIDERNAME.  Subclasses set ``listeners``
+    (the ReadListeners their reader feeds) and provide ``write``,
+    ``flush`` and ``_next_item``.
+    """
+    def __init__(self, glidername, verbose=False, debug=False,
+                 timeout=DEFAULT_TIMEOUT):
+        self.name = glidername
+        self.verbose = verbose
+        self.debug = debug
+        self.timeout = timeout
+        # latest value of every sensor seen, and all values seen during the
+        # last read_headings call
+        self.sensors = {}
+        self.last_sensors = {}
+        self._cancelled = threading.Event()
+        # stage timings of each read (see cc.timing)
+        self.timer = StageTimer()
+        # what read_headings does with the lines read (see cc.live)
+        self.echo = LineEcho()
+
+    def _next_item(self, deadline):
+        """Block until the next (line, sensors) tuple arrives or DEADLINE
+        (a time.time() value) passes, returning (None, None) on timeout, and
+        raise ReadCancelledException once ``cancel`` has been called.
+        """
+        raise NotImplementedError
+
+    def _next_line(self, deadline):
+        return self._next_item(deadline)[0]
+
+    def read_headings(self, count=10, timeout=None):
+        """Read COUNT compass headings from the glider, returning as soon as
+        the last one arrives.  Raises HeadingTimeoutException if they do not
+        all arrive within TIMEOUT seconds (defaults to ``self.timeout``).
+        Every other sensor value reported meanwhile is kept in
+        ``self.last_sensors``.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        headings = []
+        self.last_sensors = {}
+        hdg_lines = []
+        othr_lines = []
+        if self.verbose:
+            print 'Gathering %d headings.' % count
+        # flush buffer so headings aren't old
+        started = time.time()
+        self.flush()
+        flushed = first = time.time()
+        self.timer.add('flush', flushed - started)
+        echo = 0.
+        self._cancelled.clear()
+        deadline = time.time() + timeout
+        while len(headings) < count:
+            line, sensors = self._next_item(deadline)
+            if line is None:
+                raise HeadingTimeoutException(
+                    'Only %d of %d headings received from %s in %.0f s.'
+                    % (len(headings), count, self.name, timeout), headings)
+            self.timer.count('lines')
+            printed = time.time()
+            self.echo(line)
+            echo += time.time() - printed
+            for name, value in sensors.iteritems():
+                self.last_sensors.setdefault(name, []).append(value)
+            heading = sensors.get('m_heading')
+            if heading is not None:
+                if self.debug:
+                    print '  parsed heading = ', heading
+                if not headings:
+                    first = time.time()
+                hdg_lines.append(line)
+                headings.append(heading)
+            else:
+                othr_lines.append(line)
+        self.timer.count('headings', len(headings))
+        self.timer.add('first_heading', first - flushed)
+        self.timer.add('rest_headings', time.time() - first)
+        self.timer.add('echo', echo)
+        if self.verbose:
+            print '\nAdditional Output:'
+            for line in othr_lines:
+                print line.rstrip()
+            print 'Heading Output:'
+            for line in hdg_lines:
+                print line.rstrip()
+        return headings
+
+    def read_headings_async(self, count=10, timeout=None):
+        """Start reading COUNT compass headings without blocking.  Returns a
+        PendingRead whose ``result()`` gives the headings.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        return self.listeners.add(
+            PendingRead(self.name, 'm_heading', count, timeout))
+
+    def get_mag_var_async(self, timeout=None):
+        """Request the magnetic declination without blocking.  Returns a
+        PendingRead whose ``result()`` gives the declination in radians.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        # the gliders handle mag_var negatively
+        read = PendingRead(
+            self.name, 'm_gps_mag_var', timeout=timeout, bare_reply=True,
+            sign=-1)
+        if 'm_gps_mag_var' in self.sensors:
+            read.feed('', self.sensors)
+            return read
+        self.listeners.add(read)
+        self.write('get m_gps_mag_var')
+        return read
+
+
+class ReadGroup():
+    """Waits on PendingReads from any number of gliders at once.
+    """
+    def __init__(self):
+        self.completions = Queue.Queue()
+        self.pending = []
+
+    def add(self, read):
+        read.completions = self.completions
+        self.pending.append(read)
+        if read.done():
+            self.completions.put(read)
+        return read
+
+    def as_completed(self):
+        """Yield each read as it finishes, successfully or not.  Reads that
+        pass their deadline are failed and yielded then.
+        """
+        while self.pending:
+            deadline = min(read.deadline for read in self.pending)
+            try:
+                read = self.completions.get(
+                    timeout=max(deadline - time.time(), 0.01))
+            except Queue.Empty:
+                for read in self.pending:
+                    read.expire()
+                continue
+            if read in self.pending:
+                self.pending.remove(read)
+                yield read
@@ -0,0 +1,97 @@
+""" planner.py
+Suggests where to take the next compass point and decides when enough
+points have been taken to pass or fail the compass.
+
+The next heading is the one where the fitted deviation model (see
+cc.deviation) is least certain, which adds the most information about the
+curve (a D-optimal choice).  The verdict is settled once the whole predicted
+error curve, with its uncertainty, lies within the tolerance (pass) or some
+part of it lies clearly outside (fail).
+"""
+import numpy as np
+
+from cc.deviation import TERMS, design_matrix, fit_deviation
+
+# number of standard errors either side of the predicted error curve
+Z_SCORE = 2.
+
+# small prior on every term so headings can be ranked before the model is
+# fully determined
+RIDGE = 1e-3
+
+
+def information_gain(headings_deg, candidates_deg):
+    """Relative prediction variance of the deviation model at each of
+    CANDIDATES_DEG given points at HEADINGS_DEG; the largest is where a new
+    point adds the most information.
+    """
+    matrix = design_matrix(headings_deg)
+    inverse = np.linalg.inv(
+        matrix.T.dot(matrix) + RIDGE * np.eye(len(TERMS)))
+    candidates = design_matrix(candidates_deg)
+    return np.einsum('ij,jk,ik->i', candidates, inverse, candidates)
+
+
+def suggest_heading(headings_deg, candidates_deg=None):
+    """Return the true heading (from CANDIDATES_DEG, every 5 degrees by
+    default) where the next compass point adds the most information.
+    """
+    if candidates_deg is None:
+        candidates_deg = np.arange(0., 360., 5.)
+    candidates_deg = np.asarray(candidates_deg, dtype=float)
+    headings_deg = np.asarray(headings_deg, dtype=float)
+    if not len(headings_deg):
+        return candidates_deg[0]
+    gain = information_gain(headings_deg, candidates_deg)
+    # don't suggest repeating a point
+    taken = np.isin(candidates_deg % 360, headings_deg % 360)
+    gain[taken] = -np.inf
+    return candidates_deg[np.argmax(gain)]
+
+
+class Verdict():
+    """Whether the compass errors are within TOLERANCE degrees all the way
+    around.  ``passed`` is True or False once ``settled``, else None.
+    """
+    def __init__(self, headings_deg, errors_deg, tolerance,
+                 point_stderr_deg=None):
+        self.tolerance = tolerance
+        self.passed = None
+        self.settled = False
+        self.bound = np.nan
+        fit = fit_deviation(headings_deg, errors_deg)
+        self.fit = fit
+        # the residuals need some degrees of freedom to estimate the noise
+        if fit.n_points < len(TERMS) + 2:
+            return
+        sigma = fit.sigma
+        if point_stderr_deg is not None and len(point_stderr_deg):
+            # never trust the fit more than the points themselves allow
+            sigma = max(sigma, np.sqrt(np.mean(
+                np.asarray(point_stderr_deg) ** 2)))
+        curve_hdgs = np.arange(0., 360., 1.)
+        predicted = np.abs(fit.predict(curve_hdgs))
+        matrix = design_matrix(headings_deg)
+        inverse = np.linalg.pinv(matrix.T.dot(matrix))
+        curve = design_matrix(curve_hdgs)
+        stderr = sigma * np.sqrt(
+            np.einsum('ij,jk,ik->i', curve, inverse, curve))
+        upper = predicted + Z_SCORE * stderr
+        lower = predicted - Z_SCORE * stderr
+        if upper.max() < tolerance:
+            self.settled = True
+            self.passed = True
+            self.bound = upper.max()
+        elif lower.max() > tolerance:
+            self.settled = True
+            self.passed = False
+            self.bound = lower.max()
+
+    def __str__(self):
+        if not self.settled:
+            return 'not settled yet'
+        if self.passed:
+            return ('PASS: errors are within %.2f deg everywhere (at most '
+                    '%.2f deg)' % (self.tolerance, self.bound))
+        return ('FAIL: errors exceed %.2f deg (by at least %.2f deg)'
+                % (self.tolerance, self.bound - self.tolerance))
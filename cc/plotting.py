@@ -0,0 +1,196 @@
+""" plotting.py
+Compass check plots.  matplotlib is only loaded when a plot is made, as
+importing pyplot takes most of compass_check's start up time, and plots are
+only drawn into files when there is no display to show them on.
+"""
+import os
+import sys
+
+import numpy as np
+
+from cc.deviation import design_matrix, fit_deviation
+
+
+def headless():
+    """True when plots cannot be shown, e.g. over ssh without X
+    forwarding.  Windows and Mac always have a display.
+    """
+    if sys.platform in ('win32', 'cygwin', 'darwin'):
+        return False
+    return not (os.environ.get('DISPLAY') or
+                os.environ.get('WAYLAND_DISPLAY'))
+
+
+def pyplot(agg=False):
+    """Import and return matplotlib.pyplot, choosing the non-interactive
+    Agg backend when AGG (only files are drawn) or headless, unless a
+    backend has been chosen already.
+    """
+    if 'matplotlib.pyplot' not in sys.modules and (agg or headless()) \
+            and not os.environ.get('MPLBACKEND'):
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def show():
+    """Show the plots made, unless they can only be saved.
+    """
+    plt = pyplot()
+    if plt.get_backend().lower() != 'agg':
+        plt.show()
+
+
+# --Compass rose and error plots--
+# Every heading of every check is drawn in one LineCollection per kind of
+# line, so overlaying many checks costs little more than drawing one.
+# CHECKS are anything with the ArchivedCheck attributes (see cc.archive),
+# e.g. CompassData.archived() or cc.archive.read_archive results.
+
+# checks beyond this many are labelled by their date range, not a legend
+MAX_LEGEND = 8
+
+
+def rose_segments(headings_deg, inner=0., outer=1.):
+    """An (n, 2, 2) array of polar (theta, r) line segments from radius
+    INNER to OUTER at each of HEADINGS_DEG.
+    """
+    theta = np.deg2rad(np.asarray(headings_deg, dtype=float))
+    segments = np.empty((len(theta), 2, 2))
+    segments[:, :, 0] = theta[:, np.newaxis]
+    segments[:, 0, 1] = inner
+    segments[:, 1, 1] = outer
+    return segments
+
+
+def rose_collection(ax, headings_deg, inner=0., outer=1., **kwargs):
+    """Add a LineCollection of radial lines at HEADINGS_DEG to the polar
+    axes AX, which must have north up and headings clockwise.  The lines
+    are projected here in one go, so drawing them only needs the axes'
+    affine transforms rather than the polar transform of each line.
+    """
+    from matplotlib.collections import LineCollection
+    segments = rose_segments(headings_deg, inner, outer)
+    # clockwise from north to counter-clockwise from east
+    theta = 0.5 * np.pi - segments[:, :, 0]
+    radius = segments[:, :, 1]
+    projected = np.dstack([radius * np.cos(theta), radius * np.sin(theta)])
+    collection = LineCollection(
+        projected,
+        transform=ax.transProjectionAffine + ax.transWedge + ax.transAxes,
+        **kwargs)
+    ax.add_collection(collection, autolim=False)
+    return collection
+
+
+def stem_segments(headings_deg, errors_deg):
+    """An (n, 2, 2) array of line segments from zero up (or down) to each
+    of ERRORS_DEG at HEADINGS_DEG.
+    """
+    headings = np.asarray(headings_deg, dtype=float)
+    segments = np.zeros((len(headings), 2, 2))
+    segments[:, :, 0] = headings[:, np.newaxis]
+    segments[:, 1, 1] = errors_deg
+    return segments
+
+
+def fit_curves(checks, step=1.):
+    """The fitted deviation curve of each check with enough points for the
+    one and two cycle terms, as an (n_curves, n_headings, 2) array, and the
+    indices of the checks they belong to.
+    """
+    headings = np.arange(0., 360. + step, step)
+    fitted = [
+        (ii, fit_deviation(check.column('glider_true_deg'),
+                           check.column('error')).coefficients)
+        for ii, check in enumerate(checks) if len(check) >= 3]
+    if not fitted:
+        return np.zeros((0, len(headings), 2)), np.zeros(0, dtype=int)
+    index, coefficients = zip(*fitted)
+    # every curve in one product of the model terms and coefficients
+    errors = design_matrix(headings).dot(np.array(coefficients).T).T
+    curves = np.empty((len(index), len(headings), 2))
+    curves[:, :, 0] = headings
+    curves[:, :, 1] = errors
+    return curves, np.array(index)
+
+
+def check_label(check):
+    return ' '.join(
+        [check.glider, check.date] + ([check.time] if check.time else []))
+
+
+def compass_figure(checks, title=None, fit=True):
+    """Draw the compass rose (true headings and the compass's true
+    headings) and the errors, with their fitted deviation curves if FIT,
+    of every one of CHECKS on one figure.  Returns the figure.
+    """
+    plt = pyplot()
+    from matplotlib.collections import LineCollection
+    checks = list(checks)
+    colors = plt.cm.viridis(np.linspace(0., 0.9, max(len(checks), 1)))
+    if len(checks) == 1:
+        colors = np.array([[0.8, 0., 0., 1.]])
+    n_points = [len(check) for check in checks]
+    point_colors = np.repeat(colors[:len(checks)], n_points, axis=0)
+
+    def stacked(key):
+        return np.concatenate(
+            [np.asarray(check.column(key), dtype=float)
+             for check in checks] + [np.zeros(0)])
+    true_hdgs = stacked('glider_true_deg')
+    compass_hdgs = stacked('compass_true_deg')
+    errors = stacked('error')
+
+    fig = plt.figure(figsize=(12, 5.5))
+    rose = fig.add_subplot(1, 2, 1, polar=True)
+    rose.set_theta_direction(-1)
+    rose.set_theta_offset(0.5 * np.pi)
+    rose.set_ylim(0., 1.05)
+    rose_collection(rose, true_hdgs, colors='0.6', linewidths=1)
+    rose_collection(
+        rose, compass_hdgs, 0., 0.9, colors=point_colors, linewidths=1.5)
+    rose.set_yticklabels([])
+    rose.set_title('True (grey) and compass headings', y=1.08,
+                   fontsize='medium')
+
+    ax = fig.add_subplot(1, 2, 2)
+    # the limits are set below, so the collections skip autoscaling
+    ax.add_collection(LineCollection(
+        stem_segments(true_hdgs, errors), colors=point_colors,
+        linewidths=1, linestyles='dotted'), autolim=False)
+    ax.scatter(true_hdgs, errors, c=point_colors, s=16, zorder=3)
+    y_values = errors
+    if fit:
+        curves, index = fit_curves(checks)
+        if len(index):
+            ax.add_collection(LineCollection(
+                curves, colors=colors[index], linewidths=1.5),
+                autolim=False)
+            y_values = np.concatenate([errors, curves[:, :, 1].ravel()])
+    ax.axhline(0., color='k', linewidth=0.8)
+    ax.set_xlim(-5, 365)
+    if len(y_values):
+        spread = max(np.ptp(y_values), 1.)
+        ax.set_ylim(y_values.min() - spread / 10,
+                    y_values.max() + spread / 10)
+    ax.set_xlabel('Glider True Heading, [degrees]')
+    ax.set_ylabel('Heading error, [degrees]')
+
+    if 1 < len(checks) <= MAX_LEGEND:
+        from matplotlib.lines import Line2D
+        ax.legend(
+            [Line2D([], [], color=color) for color in colors],
+            [check_label(check) for check in checks],
+            loc='best', fontsize='small')
+    elif len(checks) > MAX_LEGEND:
+        ax.set_title('%s to %s (yellow is latest)' % (
+            check_label(checks[0]), check_label(checks[-1])),
+            fontsize='small')
+    if title is None and len(checks) == 1:
+        title = check_label(checks[0])
+    if title:
+        fig.suptitle(title)
+    fig.subplots_adjust(top=0.82, wspace=0.3)
+    return fig
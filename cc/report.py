@@ -0,0 +1,258 @@
+""" report.py
+A single HTML report of many compass checks: a summary table of the fleet,
+an overlay plot of every check and, for each glider, its checks' plots,
+points and deviation fits.
+
+The plots are drawn in a pool of processes and kept in an on-disk cache
+named by a hash of the checks drawn, so building the report again after
+more checks are added only draws the new plots.  The PNGs are embedded in
+the HTML so the report is one file that can be mailed or archived.
+"""
+import base64
+import cgi
+import hashlib
+import os
+import os.path
+import time
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from cc.deviation import TERMS, fit_deviation
+from cc.planner import Verdict
+from cc.plotting import check_label
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.cc', 'report_cache')
+
+# change to draw every cached plot again, e.g. after changing the plots
+RENDER_VERSION = '1'
+
+# point table columns: (heading, column, format)
+POINT_TABLE = (
+    ('Pedestal', 'pedestal_deg', '%d'),
+    ('True', 'glider_true_deg', '%d'),
+    ('Compass Mag', 'compass_mag_deg', '%.2f'),
+    ('Compass True', 'compass_true_deg', '%.2f'),
+    ('Std Dev', 'compass_std_deg', '%.2f'),
+    ('Samples', 'n_samples', '%d'),
+    ('Error', 'error', '%.2f'))
+
+STYLE = """
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; margin: 0.5em 0 1.5em 0; }
+th, td { border: 1px solid #bbb; padding: 2px 8px; text-align: right; }
+th { background: #eee; }
+td.name { text-align: left; }
+.fail { color: #c00; font-weight: bold; }
+.pass { color: #080; }
+img { max-width: 100%; }
+"""
+
+
+def content_key(checks, title=None):
+    """The cache key of a plot of CHECKS: a hash of everything drawn."""
+    digest = hashlib.sha1(RENDER_VERSION)
+    digest.update(repr(title))
+    for check in checks:
+        digest.update(repr((check.glider, check.date, check.time)))
+        for key in ('glider_true_deg', 'compass_true_deg', 'error'):
+            digest.update(
+                np.ascontiguousarray(check.column(key), dtype=float))
+    return digest.hexdigest()
+
+
+def render_plot(job):
+    """Draw the plot of the JOB (key, checks, title, cache directory)
+    into the cache unless it is there already.  Run in a worker process.
+    Returns the key.
+    """
+    key, checks, title, cache_dir = job
+    path = os.path.join(cache_dir, key + '.png')
+    if os.path.exists(path):
+        return key
+    from cc.plotting import pyplot, compass_figure
+    plt = pyplot(agg=True)
+    fig = compass_figure(checks, title)
+    # written under another name first so a half written file is never
+    # taken for a cached plot
+    tmp_path = '%s.%d.tmp.png' % (path[:-4], os.getpid())
+    fig.savefig(tmp_path)
+    plt.close(fig)
+    os.rename(tmp_path, path)
+    return key
+
+
+def render_plots(jobs, cache_dir, processes=None):
+    """Draw the plots of JOBS ((key, checks, title) tuples) not already in
+    CACHE_DIR, in PROCESSES worker processes (default one per CPU).
+    Returns the number of plots drawn.
+    """
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    missing = dict(
+        (key, (key, checks, title, cache_dir))
+        for key, checks, title in jobs
+        if not os.path.exists(os.path.join(cache_dir, key + '.png')))
+    if not missing:
+        return 0
+    processes = min(processes or cpu_count(), len(missing))
+    if processes <= 1:
+        for job in missing.values():
+            render_plot(job)
+    else:
+        pool = Pool(processes)
+        try:
+            # the biggest plots first so no worker is left with them last
+            pool.map(render_plot, sorted(
+                missing.values(), key=lambda job: -sum(map(len, job[1]))),
+                chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return len(missing)
+
+
+def check_summary(check, tolerance=None):
+    """The summary statistics of CHECK: its fitted deviation and, given a
+    TOLERANCE in degrees, its pass/fail verdict.
+    """
+    errors = np.asarray(check.column('error'), dtype=float)
+    fit = fit_deviation(check.column('glider_true_deg'), errors)
+    max_err, max_hdg = fit.max_error()
+    summary = {
+        'n_points': len(check), 'fit': fit,
+        'max_abs_error': np.abs(errors).max(),
+        'mean_error': errors.mean(),
+        'mean_std': np.nanmean(check.column('compass_std_deg')),
+        'max_predicted': max_err, 'max_predicted_heading': max_hdg,
+        'verdict': None}
+    if tolerance is not None:
+        summary['verdict'] = Verdict(
+            check.column('glider_true_deg'), errors, tolerance,
+            np.asarray(check.column('compass_std_deg')) /
+            np.sqrt(check.column('n_samples')))
+    return summary
+
+
+def _verdict_cell(verdict):
+    if verdict is None:
+        return ''
+    if not verdict.settled:
+        return '<td>unsettled</td>'
+    if verdict.passed:
+        return '<td class="pass">PASS</td>'
+    return '<td class="fail">FAIL</td>'
+
+
+def _image(cache_dir, key, alt):
+    with open(os.path.join(cache_dir, key + '.png'), 'rb') as fid:
+        data = base64.b64encode(fid.read())
+    return '<img src="data:image/png;base64,%s" alt="%s">\n' % (
+        data, cgi.escape(alt, True))
+
+
+def _anchor(check):
+    return 'c-' + '-'.join(
+        [check.glider, check.date, (check.time or '').replace(':', '')])
+
+
+def write_report(path, checks, title='Compass Check Report',
+                 cache_dir=DEFAULT_CACHE, processes=None, tolerance=None):
+    """Write the HTML report of CHECKS (ArchivedChecks) to PATH.  Returns
+    the number of plots drawn and the number taken from the cache.
+    """
+    checks = sorted(
+        checks, key=lambda check: (check.glider, check.date, check.time))
+    gliders = []
+    by_glider = {}
+    for check in checks:
+        if check.glider not in by_glider:
+            gliders.append(check.glider)
+        by_glider.setdefault(check.glider, []).append(check)
+
+    # every plot: the fleet, each glider with several checks, each check
+    fleet_title = 'All checks'
+    jobs = [(content_key(checks, fleet_title), checks, fleet_title)]
+    glider_keys = {}
+    for glider in gliders:
+        if len(by_glider[glider]) > 1:
+            glider_title = '%s: all checks' % glider
+            glider_keys[glider] = content_key(by_glider[glider], glider_title)
+            jobs.append(
+                (glider_keys[glider], by_glider[glider], glider_title))
+    check_keys = [content_key([check]) for check in checks]
+    jobs.extend(
+        (key, [check], None) for key, check in zip(check_keys, checks))
+    n_drawn = render_plots(jobs, cache_dir, processes)
+    keys = dict(zip([id(check) for check in checks], check_keys))
+
+    summaries = dict(
+        (id(check), check_summary(check, tolerance)) for check in checks)
+    out = []
+    out.append('<!DOCTYPE html>\n<html><head><meta charset="utf-8">\n')
+    out.append('<title>%s</title>\n<style>%s</style>\n</head><body>\n'
+               % (cgi.escape(title), STYLE))
+    out.append('<h1>%s</h1>\n<p>%d checks of %d gliders, generated %s '
+               'UTC.</p>\n' % (cgi.escape(title), len(checks), len(gliders),
+                               time.strftime('%Y-%m-%d %H:%M', time.gmtime())))
+
+    out.append('<h2>Summary</h2>\n<table>\n<tr><th>Glider</th><th>Date</th>'
+               '<th>Time</th><th>Points</th><th>Max |Error|</th>'
+               '<th>Mean Error</th><th>Mean Std Dev</th>'
+               '<th>Max Predicted</th><th>At Heading</th>'
+               '<th>RMS Residual</th>%s</tr>\n'
+               % ('<th>Verdict</th>' if tolerance is not None else ''))
+    for check in checks:
+        summary = summaries[id(check)]
+        out.append(
+            '<tr><td class="name"><a href="#%s">%s</a></td>'
+            '<td class="name">%s</td><td class="name">%s</td><td>%d</td>'
+            '<td>%.2f</td><td>%.2f</td><td>%.2f</td><td>%.2f</td>'
+            '<td>%.0f</td><td>%.2f</td>%s</tr>\n' % (
+                _anchor(check), cgi.escape(check.glider), check.date,
+                check.time or '', summary['n_points'],
+                summary['max_abs_error'], summary['mean_error'],
+                summary['mean_std'], summary['max_predicted'],
+                summary['max_predicted_heading'],
+                summary['fit'].rms_residual(),
+                _verdict_cell(summary['verdict'])))
+    out.append('</table>\n')
+    if tolerance is not None:
+        out.append('<p>Verdicts for a tolerance of %.2f degrees.</p>\n'
+                   % tolerance)
+    out.append(_image(cache_dir, jobs[0][0], fleet_title))
+
+    for glider in gliders:
+        out.append('<h2>%s</h2>\n' % cgi.escape(glider))
+        if glider in glider_keys:
+            out.append(_image(
+                cache_dir, glider_keys[glider], '%s: all checks' % glider))
+        for check in by_glider[glider]:
+            summary = summaries[id(check)]
+            out.append('<h3 id="%s">%s</h3>\n' % (
+                _anchor(check), cgi.escape(check_label(check))))
+            out.append('<p>Offset %.1f deg, declination %.2f deg.  %s</p>\n'
+                       % (check.offset_deg, check.declination_deg,
+                          cgi.escape(check.source)))
+            out.append(_image(cache_dir, keys[id(check)], check_label(check)))
+            out.append('<table>\n<tr>%s</tr>\n' % ''.join(
+                '<th>%s</th>' % name for name, key, fmt in POINT_TABLE))
+            columns = [
+                (check.column(key), fmt) for name, key, fmt in POINT_TABLE]
+            for ii in range(len(check)):
+                out.append('<tr>%s</tr>\n' % ''.join(
+                    '<td>%s</td>' % (fmt % values[ii]
+                                     if np.isfinite(values[ii]) else '')
+                    for values, fmt in columns))
+            out.append('</table>\n')
+            fit = summary['fit']
+            out.append('<table>\n<tr>%s<th>RMS Residual</th></tr>\n<tr>%s'
+                       '<td>%.2f</td></tr>\n</table>\n' % (
+                           ''.join('<th>%s</th>' % term for term in TERMS),
+                           ''.join('<td>%.2f</td>' % coefficient
+                                   for coefficient in fit.coefficients),
+                           fit.rms_residual()))
+    out.append('</body></html>\n')
+    with open(path, 'w') as fid:
+        fid.write(''.join(out))
+    return n_drawn, len(jobs) - n_drawn
@@ -0,0 +1,105 @@
+""" schedule.py
+Pedestal schedules for running a compass check unattended (batch mode).
+
+A schedule is a JSON file such as::
+
+    {
+        "headings": [0, 45, 90, 135, 180, 225, 270, 315],
+        "settle": 5,
+        "samples": 10,
+        "offset": 0,
+        "declination_deg": 15.3,
+        "turntable_command": "turntable --goto {heading}"
+    }
+
+Only ``headings`` (or ``step``, to take every STEP degrees from 0) is
+required.  ``settle`` is the number of seconds to wait at each heading
+before reading the compass, and ``turntable_command``, if given, is run
+through the shell to turn a motorized pedestal to each heading, with
+``{heading}`` replaced by the pedestal heading in degrees.  ``samples``,
+``offset`` and ``declination_deg`` override the command line values.
+"""
+import inspect
+import json
+import subprocess
+import sys
+import time
+
+from exceptions import Exception
+
+
+class ScheduleException(Exception):
+    pass
+
+
+class Schedule():
+    def __init__(self, headings, settle=0., samples=None, offset=None,
+                 declination_deg=None, turntable_command=None):
+        for hdg in headings:
+            if not 0 <= hdg <= 360:
+                raise ScheduleException(
+                    'Schedule heading %s is not a valid compass heading '
+                    '(0-360 degrees)' % hdg)
+        self.headings = headings
+        self.settle = settle
+        self.samples = samples
+        self.offset = offset
+        self.declination_deg = declination_deg
+        self.turntable_command = turntable_command
+
+    @classmethod
+    def load(cls, path):
+        """Read a schedule from the JSON file at PATH.
+        """
+        with open(path, 'r') as fid:
+            try:
+                config = json.load(fid)
+            except ValueError as err:
+                raise ScheduleException(
+                    'Schedule %s is not valid JSON: %s' % (path, err))
+        if 'step' in config and 'headings' in config:
+            raise ScheduleException(
+                'Schedule %s gives both "headings" and a "step"' % path)
+        if 'step' in config:
+            step = config.pop('step')
+            if isinstance(step, bool) or not isinstance(step, int) \
+                    or not 0 < step <= 360:
+                raise ScheduleException(
+                    'Schedule %s "step" must be a whole number of degrees '
+                    'from 1 to 360' % path)
+            headings = range(0, 360, step)
+        else:
+            headings = config.pop('headings', None)
+        if not headings:
+            raise ScheduleException(
+                'Schedule %s needs a list of "headings" or a "step"' % path)
+        # every setting but the headings, which are read above
+        known = inspect.getargspec(cls.__init__).args[2:]
+        unknown = [key for key in config if key not in known]
+        if unknown:
+            raise ScheduleException(
+                'Schedule %s has unknown settings: %s'
+                % (path, ', '.join(sorted(unknown))))
+        return cls(headings, **config)
+
+    def move_to(self, heading):
+        """Turn the pedestal to HEADING with the turntable command, if any.
+        """
+        if not self.turntable_command:
+            return
+        command = self.turntable_command.format(heading=heading)
+        if subprocess.call(command, shell=True) != 0:
+            raise ScheduleException(
+                'Turntable command failed: %s' % command)
+
+    def positions(self):
+        """Yield each pedestal heading once the pedestal has been moved
+        there and the settle time has passed.
+        """
+        for ii, heading in enumerate(self.headings):
+            sys.stdout.write(
+                '\nPoint %d of %d: pedestal heading %s\n'
+                % (ii + 1, len(self.headings), heading))
+            self.move_to(heading)
+            time.sleep(self.settle)
+            yield heading
@@ -0,0 +1,58 @@
+""" sensor_parser.py
+Parses the glider's sensor output lines (e.g. from ``report ++`` or ``get``
+commands) for both the serial RF and dockserver connections.
+
+A line such as ``  sensor: m_heading = 4.1233 rad`` becomes
+``SensorValue('m_heading', 4.1233, 'rad')``.  Every ``sensor: NAME = VALUE
+UNIT`` pair on a line is extracted in a single pass, and lines without the
+``sensor:`` marker are rejected before any regular expression work.
+"""
+import re
+from collections import namedtuple
+
+SensorValue = namedtuple('SensorValue', ['name', 'value', 'unit'])
+
+SENSOR_PREFIX = 'sensor:'
+
+# regex to grab every "sensor: NAME = VALUE UNIT" on a line
+sensor_regex = (
+    r'sensor:\s*(\w+)(?:\(\w*\))?\s*=\s*'
+    r'(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*([A-Za-z/%]*)')
+sensor_matcher = re.compile(sensor_regex)
+
+# regex to grab the value of a bare "get" reply, e.g. " = -0.2718 rad"
+get_value_regex = r'\s*=\s*(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*([A-Za-z/%]*)'
+gv_matcher = re.compile(get_value_regex)
+
+
+def parse_sensors(line):
+    """Return a list of SensorValue records for every sensor reported on
+    LINE, or an empty list if LINE holds no sensor output.
+    """
+    if SENSOR_PREFIX not in line:
+        return []
+    return [SensorValue(name, float(value), unit)
+            for name, value, unit in sensor_matcher.findall(line)]
+
+
+def sensor_dict(line):
+    """Return a {sensor name: value} dictionary of the sensors on LINE.
+    """
+    if SENSOR_PREFIX not in line:
+        return {}
+    return dict((name, float(value))
+                for name, value, unit in sensor_matcher.findall(line))
+
+
+def parse_value(line, name):
+    """Return the value of sensor NAME from LINE, either as a ``sensor:``
+    record or as the bare `` = VALUE UNIT`` reply to a ``get NAME`` command.
+    Returns None if LINE holds neither.
+    """
+    for record in parse_sensors(line):
+        if record.name == name:
+            return record.value
+    match = gv_matcher.match(line)
+    if match:
+        return float(match.group(1))
+    return None
@@ -6,19 +6,22 @@ The implementation here is specifically an RF connection intended for checking
 the accuracy of the glider's compass.
 """
 import serial
+import sys
 import time
-import re
-import numpy as np
+import threading
+import Queue
 from exceptions import Exception
 #import pdb
 
-# regex to grab the heading
-heading_regex = r'.+sensor: m_heading = (\d\.*\d*) rad'
-hdg_matcher = re.compile(heading_regex)
+from cc.errors import HeadingTimeoutException, ReadCancelledException
+from cc.sensor_parser import sensor_dict, parse_value
+from cc.pending import GliderConnection, ReadListeners, DEFAULT_TIMEOUT
 
-# regex to grab the magnetic variance
-get_value_regex = r' = (-*\d+\.*\d+) \w*'
-gv_matcher = re.compile(get_value_regex)
+# largest number of bytes pulled off the port in one read
+CHUNK_SIZE = 4096
+
+# most lines kept waiting for a consumer before the oldest are dropped
+LINE_BACKLOG = 10000
 
 
 class GliderConfigureException(Exception):
@@ -29,7 +32,86 @@ class SerialPortConfigureException(Exception):
     pass
 
 
-class GliderRF():
+class SerialReader(threading.Thread):
+    """Reads the serial port in large chunks on a dedicated thread,
+    assembles complete lines and hands them to consumers on ``self.lines``
+    as (line, sensors) tuples, where sensors is the {name: value}
+    dictionary of any sensor values reported on the line.  Lines are also
+    offered to any PendingReads registered on ``self.listeners``.
+    """
+    def __init__(self, ser, chunk_size=CHUNK_SIZE):
+        threading.Thread.__init__(self, name='SerialReader-%s' % ser.port)
+        self.daemon = True
+        self.ser = ser
+        self.chunk_size = chunk_size
+        self.lines = Queue.Queue(LINE_BACKLOG)
+        self.listeners = ReadListeners()
+        self._partial = bytearray()
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        while self._running.is_set():
+            try:
+                # block for the first byte (up to the port timeout), then
+                # take whatever else has already arrived in the same call
+                waiting = self.ser.inWaiting()
+                data = self.ser.read(min(max(waiting, 1), self.chunk_size))
+            except (serial.SerialException, ValueError, OSError):
+                # port closed underneath us
+                break
+            if data:
+                self.feed(data)
+
+    def feed(self, data):
+        """Split DATA (plus any partial line left from the previous chunk)
+        into complete lines and queue them.
+        """
+        with self._lock:
+            self._partial.extend(data)
+            last_eol = self._partial.rfind('\n')
+            if last_eol < 0:
+                return
+            complete = str(self._partial[:last_eol])
+            del self._partial[:last_eol + 1]
+        for line in complete.split('\n'):
+            line = line.rstrip('\r')
+            if not line:
+                continue
+            sensors = sensor_dict(line)
+            self.listeners.dispatch(line, sensors)
+            self.put((line, sensors))
+
+    def put(self, item):
+        """Queue ITEM without blocking.  When nobody is reading the queue
+        (e.g. while reads are fed through the listeners) the oldest line is
+        dropped to make room.
+        """
+        while True:
+            try:
+                self.lines.put_nowait(item)
+                return
+            except Queue.Full:
+                try:
+                    self.lines.get_nowait()
+                except Queue.Empty:
+                    pass
+
+    def flush(self):
+        """Discard every queued line and any partially received line.
+        """
+        with self._lock:
+            del self._partial[:]
+            self.lines.queue.clear()
+
+    def stop(self):
+        self._running.clear()
+        # wake any consumer blocked on the queue
+        self.put((None, None))
+
+
+class GliderRF(GliderConnection):
     '''Class GliderRF handles the serial port communication with a glider
     over a Freewave RF modem.
 
@@ -37,22 +119,28 @@ class GliderRF():
     reporting every cycle (i.e. report ++ m_heading), and in GliderLAB (i.e.
     lab_mode on).
     '''
-    def __init__(self, glidername, port, verbose=False, debug=False):
+    def __init__(self, glidername, port, verbose=False, debug=False,
+                 timeout=DEFAULT_TIMEOUT):
         #pdb.set_trace()
-        self.name = glidername
-        self.verbose = verbose
-        self.debug = debug
-        self.port = port.upper()
+        GliderConnection.__init__(self, glidername, verbose, debug, timeout)
+        if sys.platform == 'win32':
+            self.port = port.upper()
+        else:
+            # POSIX device names are case sensitive
+            self.port = port
         if debug:
             print 'Attempting connection with serial port %s' % self.port
         try:
-            self.ser = serial.Serial(self.port, 115200, timeout=1)
+            self.ser = serial.Serial(self.port, 115200, timeout=0.5)
         except:
             raise SerialPortConfigureException(
                 '\nCannot open serial port %s.  Check ports and connection and '
                 'try again.' % self.port)
         #pdb.set_trace()
         #time.sleep(1)
+        self.reader = SerialReader(self.ser)
+        self.listeners = self.reader.listeners
+        self.reader.start()
         if self.ser.isOpen():
             self.verify_serial()
             print 'Connection to port %s successful' % self.port
@@ -63,9 +151,11 @@ class GliderRF():
         readable = False  # is the serial output human readable and expected?
         for tries in range(3):  # give it 3 tries before raising exceptions
             self.write('')
-            time.sleep(0.3)
-            lines = self.ser.readlines()
-            for line in lines:
+            deadline = time.time() + 1.3
+            while True:
+                line = self._next_line(deadline)
+                if line is None:
+                    break
                 if not hdg_present:
                     if 'm_heading' in line:
                         hdg_present = True
@@ -93,67 +183,78 @@ class GliderRF():
         """Writes a command to the glider and append the end of line
         character, \r
         """
-        for char in command_string:
-            self.ser.write(char)
-        self.ser.write('\r')
+        self.ser.write(command_string + '\r')
 
-    # read COUNT number of lines and get the headings out
-    def read_headings(self, count=10):
-        """  Read COUNT number of lines of output and get compass heading data.
+    def flush(self):
+        """Discard output already received from the glider.
         """
-        headings = []
-        hdg_lines = []
-        othr_lines = []
-        line_count = 0
-        self.ser.flushInput()
-        while line_count < count:
-            line = self.ser.readline().replace('\r\n', '')
-            if line:
-                print line
-                match = hdg_matcher.match(line)
-                if match:
-                    if self.debug:
-                        print '  parsed heading = ', match.group(1)
-                    hdg_lines.append(line)
-                    headings.append(float(match.group(1)))
-                    line_count += 1
-                else:
-                    othr_lines.append(line)
-        if self.verbose:
-            print '\nAdditional Output:'
-            for line in othr_lines:
-                print line
-            print 'Heading Output:'
-            for line in hdg_lines:
-                print line
-        return headings
-
-    def get_mag_var(self, try_lines=3):
-        match = None
-        while not match:
-            self.ser.flushInput()
-            time.sleep(0.1)
+        self.reader.flush()
+
+    def cancel(self):
+        """Abort a ``read_headings`` or ``get_mag_var`` call waiting in
+        another thread.  The waiting call raises ReadCancelledException.
+        """
+        self._cancelled.set()
+        self.reader.put((None, None))
+
+    def _next_item(self, deadline):
+        """Block until the reader thread supplies the next (line, sensors)
+        tuple or DEADLINE (a time.time() value) passes.  Returns (None, None)
+        on timeout.
+        """
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None, None
+            try:
+                line, sensors = self.reader.lines.get(timeout=remaining)
+            except Queue.Empty:
+                return None, None
+            if self._cancelled.is_set():
+                raise ReadCancelledException(
+                    'Reading from glider %s cancelled.' % self.name)
+            if line is not None:
+                self.sensors.update(sensors)
+                return line, sensors
+
+    def get_mag_var(self, try_lines=3, timeout=None):
+        """Request m_gps_mag_var from the glider and return the magnetic
+        declination in radians, unless the glider has already reported it in
+        its output.  The command is re-sent if no reply is seen
+        within TRY_LINES lines of the echoed command.
+        """
+        if 'm_gps_mag_var' in self.sensors:
+            # already reported alongside the headings, no need to ask
+            return -self.sensors['m_gps_mag_var']
+        if timeout is None:
+            timeout = self.timeout
+        self._cancelled.clear()
+        deadline = time.time() + timeout
+        while True:
+            self.flush()
             self.write('get m_gps_mag_var')
-            line1 = self.ser.readline().replace('\r\n', '')
+            line1 = self._next_line(deadline)
             if self.debug:
                 print line1
             tries = 0
             while tries < try_lines:
-                line2 = self.ser.readline().replace('\r\n', '')
+                line2 = self._next_line(deadline)
+                if line2 is None:
+                    raise HeadingTimeoutException(
+                        'No m_gps_mag_var reply from %s in %.0f s.'
+                        % (self.name, timeout))
                 if self.debug:
                     print line2
-                match = gv_matcher.match(line2)
+                mag_var = parse_value(line2, 'm_gps_mag_var')
                 tries += 1
                 if self.debug:
                     print 'Try #%d of %d' % (tries, try_lines)
-                if match:
+                if mag_var is not None:
                     if self.debug:
                         print 'mag_var regex matched'
-                    mag_var = float(match.group(1))
                     if self.debug:
                         print 'mag_var = %f radians' % -mag_var
-                    break
-        return -mag_var  # the gliders handle mag_var negatively
+                    return -mag_var  # the gliders handle mag_var negatively
 
     def __enter__(self):
         """Enter code used in a "with" statement for the serial port.
@@ -163,4 +264,6 @@ class GliderRF():
     def __exit__(self, etype, evalue, etraceback):
         """Exit code used in a "with" statement for the serial port
         """
+        self.reader.stop()
+        self.reader.join(1.)
         self.ser.close()
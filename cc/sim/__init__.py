@@ -0,0 +1,10 @@
+"""Simulated glider connections for testing and benchmarking compass_check
+without hardware.
+"""
+from cc.sim.glider import SimulatedGlider
+try:
+    from cc.sim.pty_serial import PtyGlider
+except ImportError:
+    # pseudo-terminals are POSIX only; the rest still works on Windows
+    PtyGlider = None
+from cc.sim.dockserver import SimulatedDockserverComm
@@ -0,0 +1,25 @@
+"""Serve a simulated glider on a pseudo-terminal for manual testing:
+
+    python -m cc.sim [line rate] [noise]
+
+then run ``compass_check.py -s <port> simglider`` in another terminal and
+type a new true heading here whenever the glider is "rotated".
+"""
+import sys
+
+from cc.sim import SimulatedGlider, PtyGlider
+
+line_rate = float(sys.argv[1]) if len(sys.argv) > 1 else 2.
+noise = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+glider = SimulatedGlider(
+    deviation=(1., 2., -1.5, 0.5, 0.), noise=noise, line_rate=line_rate)
+with PtyGlider(glider) as pty:
+    print 'Simulated glider on port %s' % pty.port
+    while True:
+        reply = raw_input('true heading (q to quit) >> ')
+        if reply == 'q':
+            break
+        try:
+            glider.set_heading(float(reply))
+        except ValueError:
+            print 'Not a valid heading'
@@ -0,0 +1,58 @@
+""" dockserver.py
+A stand-in for dockserverTalk's ThreadedDockserverComm that serves a
+SimulatedGlider, so dockserverCom can run without a live dockserver::
+
+    comm = functools.partial(SimulatedDockserverComm, glider=sim_glider)
+    glider = dockserverCom('simglider', 'localhost', comm_class=comm)
+
+The stand-in replaces the dockserver session rather than its XML wire
+protocol: output is passed to the connected buffer handler (ccBuffer) in
+the same way ThreadedDockserverComm does.
+"""
+import Queue
+import threading
+import time
+
+
+class SimulatedDockserverComm(threading.Thread):
+    def __init__(self, hostname, gliderName, port, senderID, debug=False,
+                 glider=None):
+        threading.Thread.__init__(
+            self, name='SimulatedDockserverComm-%s' % gliderName)
+        self.daemon = True
+        self.hostname = hostname
+        self.gliderName = gliderName
+        self.port = port
+        self.senderID = senderID
+        self.debug = debug
+        self.glider = glider
+        self.MPQueue = Queue.Queue()
+        self.bufferHandler = None
+        self._replies = Queue.Queue()
+        self._running = threading.Event()
+        self._running.set()
+
+    def connect_bufferHandler(self, buffer_class):
+        self.bufferHandler = buffer_class(self)
+
+    def sendCommand(self, command_string):
+        self._replies.put(command_string)
+
+    def _add_lines(self, lines):
+        self.bufferHandler.add(''.join(line + '\r\n' for line in lines))
+
+    def run(self):
+        next_cycle = time.time()
+        while self._running.is_set():
+            try:
+                command = self._replies.get(
+                    timeout=max(next_cycle - time.time(), 0))
+                self._add_lines(self.glider.command(command))
+            except Queue.Empty:
+                pass
+            if time.time() >= next_cycle:
+                self._add_lines(self.glider.cycle_lines())
+                next_cycle += 1. / self.glider.line_rate
+
+    def terminate(self):
+        self._running.clear()
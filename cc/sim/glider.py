@@ -0,0 +1,94 @@
+""" glider.py
+A simulated Slocum glider in GliderLAB reporting its compass heading, used
+in place of a real glider for offline testing and benchmarks.
+"""
+import math
+import random
+
+# lines a glider prints between its sensor reports
+JUNK_LINES = (
+    'behavior: abend Status: 0',
+    'GPS TooFar:  -1 s',
+    'ERROR: 1 driver_odd_pitch(-1)',
+    'MissionName:lastgasp.mi MissionNum:unit_000-2026-290-0-0 (0000.0000)',
+    'sensor: m_pitch = -0.0175 rad',
+    'sensor: m_roll = 0.0087 rad',
+    'sensor: m_depth = 0.012 m')
+
+
+class SimulatedGlider():
+    """Produces the serial output of a glider reporting ``report ++
+    m_heading`` and answers ``get`` commands.
+
+    HEADING is the glider's true heading and DECLINATION the local magnetic
+    declination, both in degrees (east positive).  DEVIATION gives the
+    compass error in degrees at a true heading, either as a function or as
+    the (A, B, C, D, E) coefficients of A + B sin(h) + C cos(h) + D sin(2h) +
+    E cos(2h).  NOISE is the standard deviation in degrees of each reading,
+    LINE_RATE the number of report cycles per second and JUNK the number of
+    unrelated lines printed each cycle.  SEED makes the output repeatable.
+    """
+    def __init__(self, name='simglider', heading=0., declination=15.,
+                 deviation=(0., 0., 0., 0., 0.), noise=0.5, line_rate=2.,
+                 junk=2, lab_mode=True, seed=None):
+        self.name = name
+        self.heading = heading
+        self.declination = declination
+        self.deviation = deviation
+        self.noise = noise
+        self.line_rate = line_rate
+        self.junk = junk
+        self.lab_mode = lab_mode
+        self.cycle = 0
+        self.random = random.Random(seed)
+
+    def set_heading(self, heading):
+        """Turn the glider to true HEADING (degrees).
+        """
+        self.heading = heading % 360.
+
+    def deviation_deg(self, heading):
+        if callable(self.deviation):
+            return self.deviation(heading)
+        a, b, c, d, e = self.deviation
+        rad = math.radians(heading)
+        return (a + b * math.sin(rad) + c * math.cos(rad) +
+                d * math.sin(2 * rad) + e * math.cos(2 * rad))
+
+    def magnetic_heading(self):
+        """The compass reading in radians, including deviation and noise.
+        """
+        mag = (self.heading - self.declination -
+               self.deviation_deg(self.heading) +
+               self.random.gauss(0., self.noise))
+        return math.radians(mag % 360.)
+
+    def prompt(self):
+        if self.lab_mode:
+            return 'GliderLAB I -1 >'
+        return 'GliderDos I -1 >'
+
+    def cycle_lines(self):
+        """Return the lines printed during one report cycle.
+        """
+        self.cycle += 1
+        lines = [
+            self.random.choice(JUNK_LINES) for ii in range(self.junk)]
+        lines.append(
+            '    sensor: m_heading = %.5f rad' % self.magnetic_heading())
+        lines.append(self.prompt())
+        return lines
+
+    def command(self, command_string):
+        """Return the lines printed in reply to COMMAND_STRING.
+        """
+        command_string = command_string.strip()
+        lines = [self.prompt() + command_string]
+        if command_string == 'get m_gps_mag_var':
+            # the gliders handle mag_var negatively
+            lines.append(
+                'sensor: m_gps_mag_var = %.5f rad'
+                % -math.radians(self.declination))
+        elif command_string.startswith('get '):
+            lines.append('unknown sensor: %s' % command_string[4:])
+        return lines
@@ -0,0 +1,59 @@
+""" pty_serial.py
+Serves a SimulatedGlider on a pseudo-terminal so GliderRF can connect to it
+as though it were a Freewave modem on a serial port (POSIX only).
+"""
+import os
+import select
+import threading
+import time
+import tty
+
+
+class PtyGlider(threading.Thread):
+    """Writes GLIDER's output to a pseudo-terminal at its line rate and
+    answers the commands written to it.  Connect to ``self.port``.
+    """
+    def __init__(self, glider):
+        threading.Thread.__init__(self, name='PtyGlider-%s' % glider.name)
+        self.daemon = True
+        self.glider = glider
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self._command = ''
+        self._running = threading.Event()
+        self._running.set()
+
+    def _write_lines(self, lines):
+        os.write(self.master, ''.join(line + '\r\n' for line in lines))
+
+    def run(self):
+        next_cycle = time.time()
+        while self._running.is_set():
+            wait = max(next_cycle - time.time(), 0)
+            ready = select.select([self.master], [], [], wait)[0]
+            if ready:
+                try:
+                    data = os.read(self.master, 1024)
+                except OSError:
+                    break
+                self._command += data
+                while '\r' in self._command:
+                    command, self._command = self._command.split('\r', 1)
+                    self._write_lines(self.glider.command(command))
+            if time.time() >= next_cycle:
+                self._write_lines(self.glider.cycle_lines())
+                next_cycle += 1. / self.glider.line_rate
+
+    def stop(self):
+        self._running.clear()
+        self.join(1.)
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, etype, evalue, etraceback):
+        self.stop()
@@ -0,0 +1,109 @@
+""" streaming.py
+Continuous heading acquisition: instead of reading a fixed number of
+headings per compass point, headings stream into a rolling window whose
+circular mean and spread are watched until the glider has settled.
+"""
+import Queue
+import time
+
+import numpy as np
+
+from cc.circstats import circ_mean, circ_std
+
+
+class HeadingWindow():
+    """Rolling window of the SIZE most recent headings (radians), held in a
+    preallocated ring.
+    """
+    def __init__(self, size=20):
+        self.size = size
+        self._ring = np.full(size, np.nan)
+        self._next = 0
+        self.count = 0
+
+    def add(self, heading):
+        self._ring[self._next] = heading
+        self._next = (self._next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def drop_oldest(self):
+        self._ring[(self._next - self.count) % self.size] = np.nan
+        self.count -= 1
+
+    def trim(self, threshold):
+        """Drop the oldest headings until the spread of the rest is below
+        THRESHOLD degrees, leaving the settled tail of the window.
+        """
+        while self.count > 1 and not self.spread() < threshold:
+            self.drop_oldest()
+
+    def clear(self):
+        self._ring[:] = np.nan
+        self._next = 0
+        self.count = 0
+
+    def headings(self):
+        """The headings in the window, oldest first.
+        """
+        first = self._next - self.count
+        return list(self._ring[np.arange(first, self._next) % self.size])
+
+    def mean(self):
+        """Circular mean of the window in radians.
+        """
+        return float(circ_mean(self._ring))
+
+    def spread(self):
+        """Circular standard deviation of the window in degrees.
+        """
+        return float(np.rad2deg(circ_std(self._ring)))
+
+    def settled(self, threshold, min_samples):
+        """True once the window holds at least MIN_SAMPLES headings whose
+        spread is below THRESHOLD degrees.  Headings from before the glider
+        settled are trimmed away.
+        """
+        self.trim(threshold)
+        return self.count >= min_samples
+
+
+class HeadingStream():
+    """Passes every m_heading a glider connection reports onto a queue.
+    Register it with the connection's ``listeners``; it stays registered
+    until ``stop`` is called.
+    """
+    def __init__(self, glider):
+        self.headings = Queue.Queue()
+        self.active = True
+        glider.listeners.add(self)
+
+    def feed(self, line, sensors):
+        if not self.active:
+            return True
+        heading = sensors.get('m_heading')
+        if heading is not None:
+            self.headings.put((time.time(), heading))
+        return False
+
+    def get(self, deadline):
+        """Return the next (time, heading), or None once DEADLINE (a
+        time.time() value) has passed.
+        """
+        try:
+            return self.headings.get(
+                timeout=max(deadline - time.time(), 0))
+        except Queue.Empty:
+            return None
+
+    def drain(self):
+        """Discard the headings queued so far, e.g. those reported while
+        the glider was being turned to the next heading.
+        """
+        while True:
+            try:
+                self.headings.get_nowait()
+            except Queue.Empty:
+                return
+
+    def stop(self):
+        self.active = False
@@ -0,0 +1,117 @@
+""" timing.py
+Per-stage timing of a compass check.
+
+A StageTimer records how long each stage of taking a compass point takes
+(flushing old glider output, waiting for the first heading, collecting the
+rest, calculating, saving, printing) and counts such as lines of glider
+output seen against headings parsed.  The glider connection records the
+reading stages and CompassData the rest, all on the same timer.  Stages
+recorded between points (e.g. reading the magnetic declination) are only
+counted in the session totals.
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StageTimer():
+    """Collects stage durations (seconds) and counts, per compass point in
+    ``points`` and for the whole session in ``totals`` and ``counts``.
+    """
+    def __init__(self):
+        self.points = []
+        self.totals = {}
+        self.calls = {}
+        self.maxima = {}
+        self.counts = {}
+        self.order = []
+        self._point = None
+
+    def start_point(self, label, transport=None):
+        """Begin recording the stages of the compass point LABEL (its
+        pedestal heading) read over TRANSPORT (the connection's name).
+        """
+        self._point = {
+            'point': label, 'transport': transport, 'start': time.time(),
+            'stages': {}, 'counts': {}}
+
+    def end_point(self):
+        """Finish the current point, adding its total time.
+        """
+        if self._point is None:
+            return
+        self._point['total'] = time.time() - self._point['start']
+        self.add('total', self._point['total'])
+        self.points.append(self._point)
+        self._point = None
+
+    def add(self, stage, seconds):
+        """Record SECONDS spent in STAGE.
+        """
+        if stage not in self.totals:
+            self.order.append(stage)
+            self.totals[stage] = 0.
+            self.calls[stage] = 0
+            self.maxima[stage] = 0.
+        self.totals[stage] += seconds
+        self.calls[stage] += 1
+        self.maxima[stage] = max(self.maxima[stage], seconds)
+        if self._point is not None and stage != 'total':
+            stages = self._point['stages']
+            stages[stage] = stages.get(stage, 0.) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage NAME.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - start)
+
+    def count(self, name, number=1):
+        self.counts[name] = self.counts.get(name, 0) + number
+        if self._point is not None:
+            counts = self._point['counts']
+            counts[name] = counts.get(name, 0) + number
+
+    def summary(self):
+        """A list of (stage, times recorded, total, mean, maximum) tuples
+        in the order the stages were first recorded.
+        """
+        return [
+            (stage, self.calls[stage], self.totals[stage],
+             self.totals[stage] / self.calls[stage], self.maxima[stage])
+            for stage in self.order]
+
+    def print_summary(self, out=None):
+        """Print the summary table to OUT, by default whatever sys.stdout
+        is at the time.
+        """
+        if not self.order:
+            return
+        out = out or sys.stdout
+        out.write('Stage timing (seconds):\n')
+        out.write('  %-16s %6s %9s %9s %9s\n'
+                  % ('Stage', 'Count', 'Total', 'Mean', 'Max'))
+        for stage, calls, total, mean, maximum in self.summary():
+            out.write('  %-16s %6d %9.3f %9.3f %9.3f\n'
+                      % (stage, calls, total, mean, maximum))
+        if self.counts:
+            out.write('  ' + ', '.join(
+                '%s: %d' % item for item in sorted(self.counts.items())))
+            out.write('\n')
+
+    def write_json(self, path):
+        """Write the session summary and every point's stages to PATH.
+        """
+        record = {
+            'summary': [
+                dict(zip(('stage', 'count', 'total', 'mean', 'max'), row))
+                for row in self.summary()],
+            'counts': self.counts,
+            'points': self.points}
+        with open(path, 'w') as fid:
+            json.dump(record, fid, indent=1)
@@ -15,13 +15,25 @@ import optparse
 import cPickle as cp
 from datetime import datetime as dt
 import numpy as np
-import matplotlib.pyplot as plt
-import serial.tools.list_ports as lp
 from exceptions import Exception
 
 from cc.parse_options import parser
-from cc.serial_rf import GliderRF
-from cc.dockserver_com import dockserverCom
+from cc.errors import HeadingTimeoutException
+from cc.pending import ReadGroup
+from cc.schedule import Schedule, ScheduleException
+from cc.capture import CaptureWriter
+from cc.streaming import HeadingWindow, HeadingStream
+from cc.deviation import fit_deviation, TERMS
+from cc.planner import suggest_heading, information_gain, Verdict
+from cc.circstats import compass_points, wrap_rad, circ_stderr
+from cc.compass_store import CompassStore
+from cc.journal import SessionJournal
+from cc.history import HistoryDB, DEFAULT_PATH as HISTORY_PATH
+from cc.archive import ArchivedCheck, POINT_COLUMNS
+from cc.export import FORMATS, write_long_csv, write_npz
+from cc.plotting import compass_figure, pyplot, show
+from cc.timing import StageTimer
+from cc.live import LiveView, LineEcho, PointProgress, echo_interval
 
 VERSION = '1.0'
 
@@ -37,6 +49,8 @@ PRINT_ROW_INFO = [  # (row header, format, data dict key)
     ('Glider True Heading:', '%6d', 'glider_true_deg'),
     ('Compass Magnetic Reading:', '%6.2f', 'compass_mag_deg'),
     ('Compass True Heading:', '%6.2f', 'compass_true_deg'),
+    ('Compass Std Dev:', '%6.2f', 'compass_std_deg'),
+    ('Samples:', '%6d', 'n_samples'),
     ('Error:', '%6.2f', 'error')]
 
 
@@ -61,6 +75,7 @@ def redtext(mesg):
 def list_ports():
     """Display a list of list of available serial ports on the local machine
     """
+    import serial.tools.list_ports as lp
     print '\nHere is the list of available ports on this machine:'
     # lp.comports returns a list of (port, description, hardware ID) tuples
     iterator = sorted(lp.comports())
@@ -79,9 +94,61 @@ def check_heading(heading):
             '0 to 360 degrees')
 
 
+def ask_pedestal_heading(show_data):
+    """Prompt until the user enters a valid pedestal heading (returned as an
+    int) or q to quit (returns None).  Typing d calls SHOW_DATA.
+    """
+    reply_ok = False
+    while not reply_ok:
+        hdg = raw_input(
+            "\nOnce glider is in position and magnetic fields are away, "
+            "\nenter the pedestal heading in positive degrees\nand hit "
+            "return to continue.\nType d to view data and q to quit:\n>> ")
+        #pdb.set_trace()
+        if hdg == 'q':
+            hdg = None
+            reply_ok = True
+        elif hdg == 'd':
+            show_data()
+        else:
+            try:
+                hdg = int(hdg)
+            except ValueError:
+                redtext('Answer is not a valid number.')
+                continue
+            if hdg >= 0 and hdg <= 360:
+                reply_ok = True
+            else:
+                redtext('Enter a valid compass heading (0-360 degrees)')
+    return hdg
+
+
+def pedestal_headings(show_data, schedule=None, advise=None):
+    """Yield each pedestal heading to take a compass point at, either from
+    SCHEDULE or asked of the user until they quit.  ADVISE, if given, is
+    called before each question.
+    """
+    if schedule is not None:
+        for hdg in schedule.positions():
+            yield hdg
+        return
+    print '\nMove glider to initial heading'
+    if advise is not None:
+        advise()
+    hdg = ask_pedestal_heading(show_data)
+    while hdg is not None:
+        yield hdg
+        print '\nMove glider to next heading'
+        if advise is not None:
+            advise()
+        hdg = ask_pedestal_heading(show_data)
+
+
 class pickler():
     """Pickler handles persistance of data in case of a failed or aborted
-    compass check.
+    compass check.  Each compass point is appended to a session journal (see
+    cc.journal) as it is taken; data pickled whole by older versions is
+    still loaded.
     """
     def __init__(self, compass_data):
         self.cd = compass_data
@@ -91,127 +158,339 @@ class pickler():
             os.mkdir(homedir + '/.cc')
         drctry = homedir + '/.cc/'
         self.pickle_name = drctry + gname + '_cc_' + DATESTR + '.pckl'
+        self.journal = SessionJournal(drctry + gname + '_cc_' + DATESTR + '.ccj')
 
     def read(self):
-        try:
+        if self.journal.exists():
+            # replaying also compacts the journal down to one record a point
+            header, points = self.journal.compact()
+            if header is None and not points:
+                return False
+            if header is not None:
+                self.cd.mag_var = header['mag_var']
+            for hdg, point in points.iteritems():
+                self.cd.data[hdg] = {'compass_sample_rad': point['samples']}
+        elif os.path.exists(self.pickle_name):
             pickle = open(self.pickle_name, 'rb')
-        except IOError:
-            pickle = None
-        if pickle:
             with pickle:
-                self.cd.data, self.cd.mag_var = cp.load(pickle)
-            print 'Loaded previously saved data.'
-            self.cd.print_headings()
-            return True
+                data, self.cd.mag_var = cp.load(pickle)
+            if isinstance(data, dict):
+                # saved by an older version as a dict of dicts
+                data = CompassStore.from_dict(data, self.cd.n_samples)
+            self.cd.data = data
+            # carry the pickled data over into the journal
+            self.write_header()
+            for hdg, point in data.iteritems():
+                self.write(hdg, point['compass_sample_rad'])
+            os.remove(self.pickle_name)
         else:
             return False
+        self.cd.recompute()
+        print 'Loaded previously saved data.'
+        self.cd.print_headings()
+        return True
 
     def remove(self):
+        self.journal.remove()
         try:
             os.remove(self.pickle_name)
         except:
             pass
 
-    def write(self):
-        pickle = open(self.pickle_name, 'wb')
-        with pickle:
-            cp.dump((self.cd.data, self.cd.mag_var), pickle)
+    def write_header(self):
+        """Record the current offset and magnetic declination.
+        """
+        self.journal.write_header(
+            glider=self.cd.gname, date=DATESTR, offset=self.cd.offset,
+            mag_var=self.cd.mag_var, n_samples=self.cd.n_samples)
+
+    def write(self, hdg, samples):
+        """Record the samples of the compass point at pedestal heading HDG.
+        """
+        self.journal.write_point(hdg, samples)
+
+
+class null_pickler():
+    """Stands in for pickler when a check's data is not to be saved, e.g.
+    when reprocessing a capture.
+    """
+    def read(self):
+        return False
+
+    def remove(self):
+        pass
+
+    def write_header(self):
+        pass
+
+    def write(self, hdg, samples):
+        pass
 
 
 class CompassData():
     def __init__(self, glidername, host_port, offset, magvar=None, n_samples=10,
-                 serialCom=False, verbose=False, debug=False):
+                 serialCom=False, verbose=False, debug=False, timeout=60.,
+                 glider=None, capture=False, persist=True, stream=False,
+                 settle_deg=0.5, min_samples=5, target_stderr=None,
+                 tolerance=None, history=None, formats=('csv',), live=None,
+                 echo=None):
         self.n_samples = n_samples
         self.gname = glidername
         self.offset = offset
         self.mag_var = magvar
         self.verbose = verbose
         self.debug = debug
+        # streaming mode: take each point from a rolling window of up to
+        # n_samples headings once their spread is below settle_deg
+        self.stream = stream
+        self.settle_deg = settle_deg
+        self.min_samples = min(min_samples, n_samples)
+        # adaptive sampling: take from min_samples up to n_samples headings
+        # per point, stopping once the standard error of their mean is
+        # below target_stderr degrees
+        self.target_stderr = target_stderr
+        # error limit in degrees for the pass/fail verdict; also turns on
+        # the next heading suggestions
+        self.tolerance = tolerance
+        # history database (see cc.history) that write_data adds the check
+        # to, or None
+        self.history = history
+        # result file formats written by write_data (see cc.export)
+        self.formats = formats
+        # this glider's table in a cc.live.LiveView, shown instead of
+        # printing each point while the view is active, and the running
+        # values of the point being read
+        self.live = live
+        self.progress = None
+        # compass mean (radians) of the last point taken, which the glider
+        # must turn away from before a streamed point is taken; the points
+        # themselves are sorted by pedestal heading, not time
+        self.last_mag_rad = None
+        self.tstamp = TSTAMP
         self.fname = self.gname + '_cc_' + DATESTR + '_' + TIMESTR1
-        self.data = {}
+        self.data = CompassStore(n_samples)
 
         # bind the data persistor (pickler) and check for any saved data.  If
         # any, pickler loads it into self.data
         loaded = False
-        self.pickler = pickler(self)
+        if persist:
+            self.pickler = pickler(self)
+        else:
+            self.pickler = null_pickler()
         loaded = self.pickler.read()
         if loaded: print('Saved Data has been loaded.')
 
-        # setup appropriate communication system with glider
-        if serialCom:
-            self.glider = GliderRF(glidername, host_port, verbose, debug)
+        # setup appropriate communication system with glider, unless an
+        # already connected one (e.g. a simulator) is given.  Only the
+        # transport used is imported.
+        if glider is not None:
+            self.glider = glider
+        elif serialCom:
+            from cc.serial_rf import GliderRF
+            self.glider = GliderRF(
+                glidername, host_port, verbose, debug, timeout=timeout)
         else:
-            self.glider = dockserverCom(glidername, host_port, verbose, debug)
-
-        # --Begin collecting data--
+            from cc.dockserver_com import dockserverCom
+            self.glider = dockserverCom(
+                glidername, host_port, verbose, debug, timeout=timeout)
+
+        # time each stage of every point; the connection records the
+        # reading stages on the same timer
+        self.timer = StageTimer()
+        if hasattr(self.glider, 'timer'):
+            self.glider.timer = self.timer
+        # what the connection does with the glider output it reads
+        if echo is not None and hasattr(self.glider, 'echo'):
+            self.glider.echo = echo
+
+        # optionally record the raw glider output of every point
+        self.capture = None
+        if capture:
+            self.capture = CaptureWriter(self.fname + '.cap')
+            self.glider.listeners.add(self.capture)
+
+    def run(self, schedule=None):
+        """Collect compass points from the glider interactively until the
+        user quits, or unattended at each heading of SCHEDULE (a
+        cc.schedule.Schedule).
+        """
         self.headings = []
-        with self.glider:
-            if not self.mag_var:
-                self.mag_var = self.glider.get_mag_var()
-            self.config_check()
-            print '\nMove glider to initial heading'
-            self.pd_hdg = self.input_pedestal_heading()
-            while self.pd_hdg is not None:
-                self.get_compass_point()
-                print '\nMove glider to next heading'
-                self.pd_hdg = self.input_pedestal_heading()
+        try:
+            with self.glider:
+                if not self.mag_var:
+                    self.mag_var = self.glider.get_mag_var()
+                if schedule is None:
+                    self.config_check()
+                self.write_headers()
+                if self.live_active():
+                    self.show_live()
+                if self.stream:
+                    self.heading_stream = HeadingStream(self.glider)
+                    # nobody confirms the glider has been turned when working
+                    # through a schedule by hand, so wait to see it move
+                    self.await_move = (
+                        schedule is not None and
+                        not schedule.turntable_command)
+                advise = None
+                if self.tolerance is not None:
+                    advise = self.print_plan
+                for self.pd_hdg in pedestal_headings(
+                        self.print_headings, schedule, advise):
+                    try:
+                        self.get_compass_point()
+                    except HeadingTimeoutException as err:
+                        redtext(str(err) + '  Point not recorded, try again.')
+                if self.stream:
+                    self.heading_stream.stop()
+                self.pickler.remove()
+        finally:
+            if self.capture is not None:
+                self.capture.close()
 
     def get_compass_point(self):
         """ Gathers heading data from the glider and calculates the error for
         a single compass point.
         """
         # read headings from glider source (serial Freewave or Dockserver)
-        hdgs = self.glider.read_headings(self.n_samples)
+        self.timer.start_point(self.pd_hdg, self.glider.__class__.__name__)
+        try:
+            if self.capture is not None:
+                self.capture.begin_point(self.pd_hdg)
+            self.begin_progress(self.pd_hdg)
+            hdgs = None
+            try:
+                with self.timer.stage('read'):
+                    if self.stream:
+                        hdgs = self.read_settled_headings()
+                    elif self.target_stderr:
+                        hdgs = self.read_adaptive_headings()
+                    else:
+                        hdgs = self.glider.read_headings(self.n_samples)
+            finally:
+                self.end_progress()
+                if self.capture is not None:
+                    self.capture.end_point(self.pd_hdg, hdgs)
+            self.add_compass_point(self.pd_hdg, hdgs)
+        finally:
+            self.timer.end_point()
+
+    def read_settled_headings(self):
+        """Watch the streamed headings in a rolling window of up to
+        n_samples, showing the live mean and spread, and return the window
+        as soon as it has settled (at least min_samples headings spread less
+        than settle_deg).  If ``self.await_move`` is set, headings are
+        ignored until the glider has turned away from the previous point.
+        """
+        # only headings from now on belong to this point; those queued
+        # while the glider was turned are from the last one
+        self.heading_stream.drain()
+        window = HeadingWindow(self.n_samples)
+        deadline = time.time() + self.glider.timeout
+        previous = None
+        if self.await_move:
+            previous = self.last_mag_rad
+        moved = previous is None
+        while True:
+            item = self.heading_stream.get(deadline)
+            if item is None:
+                sys.stdout.write('\n')
+                raise HeadingTimeoutException(
+                    'Headings from %s did not settle within %.0f s.'
+                    % (self.gname, self.glider.timeout), window.headings())
+            window.add(item[1])
+            if not moved:
+                turned = np.rad2deg(
+                    wrap_rad(window.mean() - previous))
+                if abs(turned) < 2 * self.settle_deg + 1:
+                    window.clear()
+                    continue
+                moved = True
+            settled = window.settled(self.settle_deg, self.min_samples)
+            sys.stdout.write(
+                '\r  %2d headings: mean %6.2f deg, spread %5.2f deg  '
+                % (window.count, np.rad2deg(window.mean()), window.spread()))
+            sys.stdout.flush()
+            if settled:
+                sys.stdout.write('\n')
+                return window.headings()
+
+    def read_adaptive_headings(self):
+        """Read headings until the standard error of their circular mean
+        drops below target_stderr degrees, taking at least min_samples and
+        at most n_samples.
+        """
+        stream = HeadingStream(self.glider)
+        hdgs = []
+        deadline = time.time() + self.glider.timeout
+        try:
+            while len(hdgs) < self.n_samples:
+                item = stream.get(deadline)
+                if item is None:
+                    sys.stdout.write('\n')
+                    raise HeadingTimeoutException(
+                        'Only %d of up to %d headings received from %s in '
+                        '%.0f s, without reaching the target standard error.'
+                        % (len(hdgs), self.n_samples, self.gname,
+                           self.glider.timeout), hdgs)
+                hdgs.append(item[1])
+                stderr = np.rad2deg(circ_stderr(hdgs))
+                sys.stdout.write(
+                    '\r  %2d headings: standard error %5.2f deg  '
+                    % (len(hdgs), stderr))
+                sys.stdout.flush()
+                if (len(hdgs) >= self.min_samples and
+                        stderr < self.target_stderr):
+                    break
+        finally:
+            stream.stop()
+        sys.stdout.write('\n')
+        return hdgs
+
+    def write_headers(self):
+        """Record the settings used for the check in the saved data (and
+        the capture file, if any).
+        """
+        self.pickler.write_header()
+        if self.capture is not None:
+            self.capture.write_header(
+                glider=self.gname, tstamp=self.tstamp.isoformat(),
+                offset=self.offset, mag_var=self.mag_var,
+                n_samples=self.n_samples)
+
+    def add_compass_point(self, pd_hdg, hdgs):
+        """Calculates the error for the compass headings HDGS (radians)
+        taken at pedestal heading PD_HDG, then displays and saves the point.
+        """
+        self.pd_hdg = pd_hdg
 
         # --Calculations--
-        # compass headings added together need to be kept in the correct
-        # compass ranges (0-360, 0-2*pi) and so uses mod (%) 360 or 2*pi
-        avg_hdg = np.mean(hdgs)
-        g_true_deg = self.pd_hdg + self.offset
-        avg_deg = np.rad2deg(avg_hdg)
-        true_rad = (avg_hdg + self.mag_var) % (2*np.pi)
-        true_deg = np.rad2deg(true_rad)
-        comp_error = ((g_true_deg - true_deg + 180) % 360) - 180
-
-        # --Write to self.data dictionary--
-        data = {}
-        data['compass_sample_rad'] = hdgs
-        data['pedestal_deg'] = self.pd_hdg
-        data['glider_true_deg'] = g_true_deg % 360.
-        data['compass_mag_rad'] = avg_hdg
-        data['compass_mag_deg'] = np.rad2deg(avg_hdg)
-        data['compass_true_rad'] = true_rad
-        data['compass_true_deg'] = true_deg
-        data['error'] = comp_error
-        self.print_sample(data)
-        self.data[self.pd_hdg] = data
-        self.pickler.write()
-
-    def input_pedestal_heading(self):
-        reply_ok = False
-        while not reply_ok:
-            hdg = raw_input(
-                "\nOnce glider is in position and magnetic fields are away, "
-                "\nenter the pedestal heading in positive degrees\nand hit "
-                "return to continue.\nType d to view data and q to quit:\n>> ")
-            #pdb.set_trace()
-            if hdg == 'q':
-                hdg = None
-                reply_ok = True
-                self.pickler.remove()
-            elif hdg == 'd':
-                self.print_headings()
-            else:
-                try:
-                    hdg = int(hdg)
-                except ValueError:
-                    redtext('Answer is not a valid number.')
-                    continue
-                if hdg >= 0 and hdg <= 360:
-                    reply_ok = True
-                else:
-                    redtext('Enter a valid compass heading (0-360 degrees)')
-        return hdg
+        with self.timer.stage('compute'):
+            point = compass_points(
+                [hdgs], [self.pd_hdg], self.offset, self.mag_var)
+
+            # --Write to self.data dictionary--
+            data = dict(
+                (key, values[0]) for key, values in point.iteritems())
+            data['compass_sample_rad'] = hdgs
+            data['n_samples'] = len(hdgs)
+            data['pedestal_deg'] = self.pd_hdg
+            self.data[self.pd_hdg] = data
+            self.last_mag_rad = data['compass_mag_rad']
+        with self.timer.stage('print'):
+            self.print_sample(data)
+        with self.timer.stage('journal'):
+            self.pickler.write(self.pd_hdg, hdgs)
+
+    def recompute(self):
+        """Recalculate every compass point from its samples in one
+        vectorized call, e.g. after the offset or declination has changed.
+        """
+        if not self.data:
+            return
+        points = compass_points(
+            self.data.samples(), self.data.column('pedestal_deg'),
+            self.offset, self.mag_var)
+        self.data.update_columns(points)
 
     def config_check(self):
         """Have the user view and verify the values used for offset and
@@ -237,7 +516,7 @@ class CompassData():
                         except ValueError:
                             redtext('Value not a valid number')
                             continue
-                        except OffsetRangeError:
+                        except CompassRangeError:
                             redtext(
                                 'Not in the valid range of '
                                 '-180< offset <180 degrees.')
@@ -252,8 +531,50 @@ class CompassData():
                         self.offset = new_value
                     elif name == 'mag dec':
                         self.mag_var = new_value
+            self.recompute()
+
+    def live_active(self):
+        return self.live is not None and self.live.view.active
+
+    def show_live(self, current=None):
+        """Update the live table with the points so far and the CURRENT
+        point being read, if any.  Only the values that changed are written.
+        """
+        columns = [
+            (dat_key, self.data.column(dat_key))
+            for row_header, fmt, dat_key in PRINT_ROW_INFO]
+        points = [
+            dict((dat_key, values[ii]) for dat_key, values in columns)
+            for ii in range(len(self.data))]
+        self.live.update(
+            'Offset: %.1f; Magnetic Declination: %.2f'
+            % (self.offset, np.rad2deg(self.mag_var)), points, current)
+
+    def begin_progress(self, pd_hdg):
+        """Show the running values of the point at pedestal heading
+        PD_HDG in the live table as its headings arrive.
+        """
+        if not self.live_active():
+            return
+
+        def show(hdgs):
+            point = compass_points([hdgs], [pd_hdg], self.offset, self.mag_var)
+            current = dict(
+                (key, values[0]) for key, values in point.iteritems())
+            current['n_samples'] = len(hdgs)
+            current['pedestal_deg'] = pd_hdg
+            self.show_live(current)
+        self.progress = self.glider.listeners.add(PointProgress(show))
+
+    def end_progress(self):
+        if self.progress is not None:
+            self.progress.stop()
+            self.progress = None
 
     def print_sample(self, data):
+        if self.live_active():
+            self.show_live()
+            return
         sys.stdout.write('Offset: %.1f; ' % self.offset)
         sys.stdout.write('Magnetic Declination: %.2f\n' % np.rad2deg(self.mag_var))
         max_len = max(map(lambda x: len(x[0]), PRINT_ROW_INFO))
@@ -268,31 +589,30 @@ class CompassData():
         # print sample data gathered
         lead_space = ' ' * (max_len - 5)
         sys.stdout.write(lead_space + 'Data:')
-        for ii in range(self.n_samples):
+        for ii, comp_dat in enumerate(data['compass_sample_rad']):
             if ii > 0:
                 sys.stdout.write(' ' * max_len)
-            comp_dat = data['compass_sample_rad'][ii]
             sys.stdout.write(' %6.2f\n' % comp_dat)
 
     def print_headings(self):
         """Prints to the screen the final data set after collection in 6
-        columns at a time.
+        columns at a time.  The live table, if active, is redrawn instead.
         """
-        hdg_list = sorted(self.data.keys())
+        if self.live_active():
+            self.live.redraw()
+            return
+        columns = dict(
+            (dat_key, self.data.column(dat_key))
+            for row_header, fmt, dat_key in PRINT_ROW_INFO)
+        samples = self.data.samples()
         sys.stdout.write('Offset: %.1f; ' % self.offset)
         sys.stdout.write('Magnetic Declination: %.2f\n' % np.rad2deg(self.mag_var))
         # get maximum length of row headers for lining up everything
         max_len = max(map(lambda x: len(x[0]), PRINT_ROW_INFO))
-        while hdg_list:
-            # this part ensures printing only 6 columns at a time to prevent
-            # text from wrapping when printed to a terminal
-            if len(hdg_list) > 6:
-                last = 6
-            else:
-                last = len(hdg_list)
-            hdgs = hdg_list[0:last]
-            # pop the headings used in HDGS out of HDG_LIST
-            hdg_list[0:last] = []
+        # this part ensures printing only 6 columns at a time to prevent
+        # text from wrapping when printed to a terminal
+        for first in range(0, len(self.data), 6):
+            hdgs = slice(first, first + 6)
 
             # Printing handled
             for row_header, fmt, dat_key in PRINT_ROW_INFO:
@@ -301,61 +621,264 @@ class CompassData():
                 sys.stdout.write(lead_space + row_header)
                 # print row data
                 #pdb.set_trace()
-                for hdg in hdgs:
-                    sys.stdout.write(' '+fmt % self.data[hdg][dat_key])
+                for value in columns[dat_key][hdgs]:
+                    sys.stdout.write(' '+fmt % value)
                 sys.stdout.write('\n')
             # print sample data gathered
             lead_space = ' ' * (max_len - 5)
             sys.stdout.write(lead_space + 'Data:')
-            for ii in range(self.n_samples):
+            for ii in range(samples.shape[1]):
                 if ii > 0:
                     sys.stdout.write(' ' * max_len)
-                for hdg in hdgs:
-                    comp_dat = self.data[hdg]['compass_sample_rad'][ii]
-                    sys.stdout.write(' %6.2f' % comp_dat)
+                for comp_dat in samples[hdgs, ii]:
+                    if np.isnan(comp_dat):
+                        # this point has fewer samples
+                        sys.stdout.write(' ' * 7)
+                    else:
+                        sys.stdout.write(' %6.2f' % comp_dat)
                 sys.stdout.write('\n')
             sys.stdout.write('\n')  # add a line between sections
 
-    def plot_data(self):
-        errors = []
-        headings = []
-        for key in self.data:
-            errors.append(self.data[key]['error'])
-            headings.append(self.data[key]['glider_true_deg'])
-        if len(headings) > 1:
-            plt.stem(headings, errors, 'b:', 'bo', 'k-')
-            plt.xlim(-5, 365)
-            estd = np.std(errors)
-            plt.ylim(min(errors) - estd/4, max(errors) + estd/4)
-            plt.title(self.gname + ' ' + DATESTR + ' ' + TIMESTR2)
-            plt.xlabel('Glider True Heading, [degrees]')
-            plt.ylabel('Heading error, [degrees]')
-            plt.savefig('./' + self.fname + '.png')
-            plt.show()
+    def plot_data(self, show_plot=True):
+        """Save the plot of the check, and show it if SHOW_PLOT.
+        """
+        if len(self.data) > 1:
+            fig = compass_figure([self.archived()])
+            fig.savefig(self.fname + '.png')
+            if show_plot:
+                show()
+            else:
+                pyplot().close(fig)
         else:
             sys.stdout.write('Warning: Not enough data to make a plot!\n')
 
+    def fit_deviation(self):
+        """Fit the compass deviation model (see cc.deviation) to the
+        errors measured so far.  Returns a DeviationFit, or None without
+        data.
+        """
+        if not self.data:
+            return None
+        return fit_deviation(
+            self.data.column('glider_true_deg'), self.data.column('error'))
+
+    def print_deviation(self):
+        fit = self.fit_deviation()
+        if fit is None:
+            return
+        sys.stdout.write('Deviation fit (degrees): ')
+        sys.stdout.write('  '.join(
+            '%s = %.2f' % (term, coefficient)
+            for term, coefficient in zip(TERMS, fit.coefficients)))
+        sys.stdout.write('\n')
+        max_err, max_hdg = fit.max_error()
+        sys.stdout.write(
+            'RMS residual: %.2f; Max predicted error: %.2f at %.0f deg\n'
+            % (fit.rms_residual(), max_err, max_hdg))
+
+    def verdict(self):
+        """The pass/fail Verdict (see cc.planner) on the points so far.
+        """
+        return Verdict(
+            self.data.column('glider_true_deg'), self.data.column('error'),
+            self.tolerance,
+            self.data.column('compass_std_deg') /
+            np.sqrt(self.data.column('n_samples')))
+
+    def print_plan(self):
+        """Suggest the next pedestal heading and report whether the
+        verdict is settled.
+        """
+        true_hdgs = self.data.column('glider_true_deg')
+        suggestion = (suggest_heading(true_hdgs) - self.offset) % 360
+        self.print_verdict()
+        sys.stdout.write(
+            'Suggested next pedestal heading: %d\n' % round(suggestion))
+
+    def print_verdict(self, prefix=''):
+        """Report whether the verdict is settled, once there are points.
+        """
+        if not len(self.data):
+            return
+        verdict = self.verdict()
+        if verdict.settled:
+            redtext('%sVerdict settled after %d points, %s.  Type q to '
+                    'finish.' % (prefix, len(self.data), verdict))
+        else:
+            sys.stdout.write('%sVerdict %s.\n' % (prefix, verdict))
+
+    def csv_title(self):
+        """The first line of the CSV files written for this check.
+        """
+        return ','.join([
+            self.gname, 'Compass Check', self.tstamp.strftime('%Y-%m-%d'),
+            self.tstamp.strftime('%H:%M'),
+            'Offset:', '%d deg' % self.offset,
+            'Declination:', '%.2f deg' % np.rad2deg(self.mag_var)])
+
+    def archived(self):
+        """The results as an ArchivedCheck (see cc.archive).
+        """
+        columns = dict(
+            (key, np.asarray(self.data.column(key), dtype=float))
+            for key in POINT_COLUMNS)
+        return ArchivedCheck(
+            self.gname, self.tstamp.strftime('%Y-%m-%d'),
+            self.tstamp.strftime('%H:%M'), self.offset,
+            np.rad2deg(self.mag_var), columns, self.data.samples(),
+            self.fname + '.csv')
+
     def write_data(self):
+        if 'csv' in self.formats:
+            self.write_csv()
+        if 'long' in self.formats or 'npz' in self.formats:
+            check = self.archived()
+            if 'long' in self.formats:
+                write_long_csv(self.fname + '_long.csv', check)
+            if 'npz' in self.formats:
+                write_npz(self.fname + '.npz', check)
+        fit = self.fit_deviation()
+        if fit is not None:
+            fit.write_csv(self.fname + '_deviation.csv', self.csv_title())
+        if self.history is not None and self.data:
+            with HistoryDB(self.history) as db:
+                db.add_check(
+                    self.gname, self.tstamp, self.offset,
+                    np.rad2deg(self.mag_var), self.data, fit,
+                    source=self.fname + '.csv')
+
+    def write_csv(self):
+        """Write the transposed results CSV file: a row for each value and
+        a column for each compass point, then the samples (in radians).
+        """
         fid = open(self.fname + '.csv', 'w')
-        hdg_list = sorted(self.data.keys())
+        samples = self.data.samples()
         with fid:
-            fid.write(','.join([
-                self.gname, 'Compass Check', DATESTR, TIMESTR2,
-                'Offset:', '%d deg' % self.offset,
-                'Declination:', '%.2f deg' % np.rad2deg(self.mag_var)]))
+            fid.write(self.csv_title())
             fid.write('\n\n')
             for row_header, fmt, dat_key in PRINT_ROW_INFO:
                 fid.write(row_header)
-                for hdg in hdg_list:
-                    fid.write(',' + fmt % self.data[hdg][dat_key])
+                for value in self.data.column(dat_key):
+                    fid.write(',' + fmt % value)
                 fid.write('\n')
             fid.write('Data:')
-            for ii in range(self.n_samples):
-                for hdg in hdg_list:
-                    fid.write(',%6.2f' % self.data[hdg]['compass_sample_rad'][ii])
+            for ii in range(samples.shape[1]):
+                for comp_dat in samples[:, ii]:
+                    if np.isnan(comp_dat):
+                        fid.write(',')
+                    else:
+                        fid.write(',%6.2f' % comp_dat)
                 fid.write('\n')
 
 
+class CompassSession():
+    """Runs compass checks on several gliders at once, e.g. on adjacent
+    pedestals.  Every pedestal heading entered is taken by all of the
+    gliders in parallel, while each glider keeps its own CompassData results
+    and saved data.  The reads are driven by the connections' own reader
+    threads (see cc.pending), so no thread is started per glider.
+    """
+    def __init__(self, compass_datas):
+        self.checks = compass_datas
+
+    def print_headings(self):
+        for cd in self.checks:
+            if not cd.live_active():
+                print '\n--%s--' % cd.gname
+            cd.print_headings()
+
+    def print_plan(self):
+        """Report each glider's verdict and suggest the next pedestal
+        heading, the one adding the most information to the deviation
+        curves of all of the gliders together.
+        """
+        candidates = np.arange(0., 360., 5.)
+        gain = np.zeros(len(candidates))
+        taken = []
+        for cd in self.checks:
+            cd.print_verdict('%s: ' % cd.gname)
+            if len(cd.data):
+                gain += information_gain(
+                    cd.data.column('glider_true_deg'), candidates + cd.offset)
+                taken.extend(cd.data.keys())
+        # don't suggest repeating a point
+        gain[np.isin(candidates, np.asarray(taken) % 360)] = -np.inf
+        sys.stdout.write('Suggested next pedestal heading: %d\n'
+                         % candidates[np.argmax(gain)])
+
+    def run(self, schedule=None):
+        """Collect compass points from every glider interactively until the
+        user quits, or unattended at each heading of SCHEDULE.
+        """
+        entered = []
+        try:
+            for cd in self.checks:
+                cd.glider.__enter__()
+                entered.append(cd)
+            mag_var_reads = [
+                (cd, cd.glider.get_mag_var_async())
+                for cd in self.checks if not cd.mag_var]
+            for cd, read in mag_var_reads:
+                cd.mag_var = read.result()
+            for cd in self.checks:
+                if schedule is None:
+                    print '\n--%s--' % cd.gname
+                    cd.config_check()
+                cd.write_headers()
+                if cd.live_active():
+                    cd.show_live()
+            advise = None
+            if any(cd.tolerance is not None for cd in self.checks):
+                advise = self.print_plan
+            for pd_hdg in pedestal_headings(
+                    self.print_headings, schedule, advise):
+                group = ReadGroup()
+                checks = {}
+                for cd in self.checks:
+                    cd.timer.start_point(
+                        pd_hdg, cd.glider.__class__.__name__)
+                    with cd.timer.stage('flush'):
+                        cd.glider.flush()
+                    if cd.capture is not None:
+                        cd.capture.begin_point(pd_hdg)
+                    cd.begin_progress(pd_hdg)
+                    checks[group.add(
+                        cd.glider.read_headings_async(cd.n_samples))] = cd
+                # show each glider's point as soon as it is complete
+                for read in group.as_completed():
+                    cd = checks[read]
+                    cd.end_progress()
+                    if not cd.live_active():
+                        print '\n--%s--' % cd.gname
+                    hdgs = None
+                    try:
+                        try:
+                            hdgs = read.result()
+                        finally:
+                            if cd.capture is not None:
+                                cd.capture.end_point(pd_hdg, hdgs)
+                        cd.timer.add('read', read.finished_at - read.started)
+                        cd.timer.add(
+                            'first_heading', read.first_at - read.started)
+                        cd.timer.add(
+                            'rest_headings', read.finished_at - read.first_at)
+                        cd.timer.count('lines', read.n_lines)
+                        cd.timer.count('headings', len(hdgs))
+                        cd.add_compass_point(pd_hdg, hdgs)
+                    except HeadingTimeoutException as err:
+                        redtext(str(err) + '  Point not recorded, try again.')
+                    finally:
+                        cd.timer.end_point()
+            for cd in self.checks:
+                cd.pickler.remove()
+        finally:
+            for cd in entered:
+                cd.glider.__exit__(*sys.exc_info())
+            for cd in self.checks:
+                if cd.capture is not None:
+                    cd.capture.close()
+
+
 def main():
     print os.getcwd()
     print 'Compass Accuracy Check v. %s' % VERSION
@@ -363,24 +886,126 @@ def main():
     if options.list_ports:
         list_ports()
     if len(args) < 2:
-        redtext('\nCompass check requires 2 arguments\n')
+        redtext('\nCompass check requires at least 2 arguments\n')
         parser.print_help()
         exit()
 
-    host_port = args[0]
-    glidername = args[1]
+    glidernames = args[1:]
+    if options.serial:
+        # one serial port per glider, separated by commas
+        host_ports = args[0].split(',')
+        if len(host_ports) != len(glidernames):
+            redtext('\nGive one serial port for each glider\n')
+            parser.print_help()
+            exit()
+    else:
+        # every glider is reached through the same dockserver
+        host_ports = [args[0]] * len(glidernames)
+    if len(glidernames) > 1 and (options.stream or options.target_stderr):
+        redtext('\n--stream and --target-stderr check one glider at a '
+                'time\n')
+        parser.print_help()
+        exit()
+    if options.min_samples < 1:
+        redtext('\n--min-samples must be at least 1\n')
+        parser.print_help()
+        exit()
     offset = options.offset
     magvar = options.magvar
+    n_samples = options.samples
+    schedule = None
+    if options.schedule:
+        try:
+            schedule = Schedule.load(options.schedule)
+        except (IOError, ScheduleException) as err:
+            redtext('\n%s\n' % err)
+            exit()
+        if schedule.offset is not None:
+            offset = schedule.offset
+        if schedule.declination_deg is not None:
+            magvar = np.deg2rad(schedule.declination_deg)
+        if schedule.samples is not None:
+            n_samples = schedule.samples
     if not offset == 0.0:
         check_heading(offset)
-    cd = CompassData(
-        glidername, host_port, offset, magvar,
-        serialCom=options.serial,
-        verbose=options.verbose,
-        debug=options.debug)
-    cd.print_headings()
-    cd.plot_data()
-    cd.write_data()
+    formats = options.formats.split(',')
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        redtext('\nUnknown output format(s): %s\n' % ', '.join(unknown))
+        parser.print_help()
+        exit()
+    try:
+        interval = echo_interval(
+            options.echo or ('2' if options.live else 'all'))
+    except ValueError:
+        redtext('\n--echo takes all, none or a number of seconds\n')
+        parser.print_help()
+        exit()
+    echo = LineEcho(interval, options.echo_log)
+    view = None
+    if options.live:
+        view = LiveView()
+    checks = []
+    profiler = None
+    try:
+        try:
+            for glidername, host_port in zip(glidernames, host_ports):
+                checks.append(CompassData(
+                    glidername, host_port, offset, magvar, n_samples=n_samples,
+                    serialCom=options.serial,
+                    verbose=options.verbose,
+                    debug=options.debug,
+                    timeout=options.timeout,
+                    capture=options.capture,
+                    stream=options.stream,
+                    settle_deg=options.settle_deg,
+                    min_samples=options.min_samples,
+                    target_stderr=options.target_stderr,
+                    tolerance=options.tolerance,
+                    history=(None if options.no_history
+                             else options.history or HISTORY_PATH),
+                    formats=formats,
+                    live=(view.add_table(glidername, PRINT_ROW_INFO)
+                          if view else None),
+                    echo=echo))
+        except:
+            # close the connections to the gliders already reached
+            exc_info = sys.exc_info()
+            for cd in checks:
+                cd.glider.__exit__(*exc_info)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if options.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if view is not None and not view.start():
+            print 'No live view: the output is not a terminal tall enough.'
+        if len(checks) == 1:
+            checks[0].run(schedule)
+        else:
+            CompassSession(checks).run(schedule)
+    finally:
+        if view is not None:
+            view.stop()
+        echo.close()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(checks[0].fname + '.prof')
+    for cd in checks:
+        cd.print_headings()
+        cd.print_deviation()
+        if cd.tolerance is not None and len(cd.data):
+            print 'Verdict: %s' % cd.verdict()
+        cd.timer.print_summary()
+        if options.profile:
+            cd.timer.write_json(cd.fname + '_timing.json')
+        if schedule is None:
+            cd.plot_data()
+            cd.write_data()
+        else:
+            # nobody may be there to close the plot of an unattended check
+            cd.write_data()
+            cd.plot_data(show_plot=False)
     #print 'Soon to include graphics too.'
 
 if __name__ == '__main__':
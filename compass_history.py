@@ -0,0 +1,129 @@
+#! /usr/bin/python
+
+"""compass_history
+    Queries the history database of compass checks (see cc.history) for the
+    drift of a glider's compass over time and comparisons across the fleet.
+"""
+
+import optparse
+
+from cc.deviation import TERMS
+from cc.history import HistoryDB, DEFAULT_PATH
+
+parser = optparse.OptionParser(
+    usage=(
+        "\n    %prog [options] list [glidername]"
+        "\n    %prog [options] drift glidername"
+        "\n    %prog [options] fleet"
+        "\n    %prog [options] heading degrees [glidername]"),
+    description=(
+        """Query the compass check history.  list: the recorded checks.
+        drift: each check of a glider with its fitted error at the cardinal
+        headings (or --headings), to show how the compass has drifted.
+        fleet: the latest check of every glider, worst first.  heading: the
+        errors measured near a true heading."""))
+
+parser.add_option(
+    "--db",
+    help="History database to read (default: %s)." % DEFAULT_PATH,
+    dest="db", default=None, action='store')
+
+parser.add_option(
+    "--since",
+    help="Only checks on or after this date (YYYY-MM-DD).",
+    dest="since", default=None, action='store')
+
+parser.add_option(
+    "--until",
+    help="Only checks on or before this date (YYYY-MM-DD).",
+    dest="until", default=None, action='store')
+
+parser.add_option(
+    "--headings",
+    help=(
+        "Comma separated true headings to show the drift at (default: "
+        "0,90,180,270)."),
+    dest="headings", default='0,90,180,270', action='store')
+
+parser.add_option(
+    "--within",
+    help="Take points within this many degrees of the heading (default: 5).",
+    dest="within", default=5., action='store', type=float)
+
+
+def fmt(value, spec='%7.2f'):
+    """Format a number, or a blank of the same width for a missing one.
+    """
+    if value is None:
+        return ' ' * len(spec % 0)
+    return spec % value
+
+
+def print_checks(rows):
+    print '%-12s %-10s %-5s %6s %7s %7s %7s' % (
+        'Glider', 'Date', 'Time', 'Points', 'Offset', 'Decl', 'MaxErr')
+    for row in rows:
+        print '%-12s %-10s %-5s %6d %s %s %s' % (
+            row['glider'], row['date'], row['time'], row['n_points'],
+            fmt(row['offset_deg']), fmt(row['declination_deg']),
+            fmt(row['max_error']))
+
+
+def print_drift(rows, headings):
+    print '%-10s %-5s %s %7s  %s' % (
+        'Date', 'Time', ' '.join('%7s' % term for term in TERMS), 'RMS',
+        ' '.join('%7s' % ('@%g' % hdg) for hdg in headings))
+    for row in rows:
+        print '%-10s %-5s %s %s  %s' % (
+            row['date'], row['time'],
+            ' '.join(fmt(row[term]) for term in TERMS),
+            fmt(row['rms_residual']),
+            ' '.join(fmt(value) for value in row['predicted']))
+    if len(rows) > 1 and rows[0][TERMS[0]] is not None:
+        first, last = rows[0]['predicted'], rows[-1]['predicted']
+        print '%-16s %s %7s  %s' % (
+            'Change:', ' '.join(
+                fmt(rows[-1][term] - rows[0][term]) for term in TERMS),
+            '', ' '.join(fmt(b - a) for a, b in zip(first, last)))
+
+
+def print_points(rows):
+    print '%-12s %-10s %-5s %8s %8s %7s %7s' % (
+        'Glider', 'Date', 'Time', 'Pedestal', 'True', 'Error', 'StdDev')
+    for row in rows:
+        print '%-12s %-10s %-5s %8.0f %8.0f %s %s' % (
+            row['glider'], row['date'], row['time'], row['pedestal_deg'],
+            row['glider_true_deg'], fmt(row['error_deg']),
+            fmt(row['compass_std_deg']))
+
+
+def main():
+    (options, args) = parser.parse_args()
+    if not args or args[0] not in ('list', 'drift', 'fleet', 'heading'):
+        parser.print_help()
+        exit()
+    command, args = args[0], args[1:]
+    with HistoryDB(options.db) as db:
+        if command == 'list':
+            glider = args[0] if args else None
+            print_checks(db.checks(glider, options.since, options.until))
+        elif command == 'drift':
+            if not args:
+                parser.error('drift needs a glidername')
+            headings = [float(hdg) for hdg in options.headings.split(',')]
+            print_drift(
+                db.drift(args[0], headings, options.since, options.until),
+                headings)
+        elif command == 'fleet':
+            rows = db.latest(options.since)
+            rows.sort(key=lambda row: -(row['max_error'] or 0.))
+            print_checks(rows)
+        elif command == 'heading':
+            if not args:
+                parser.error('heading needs a true heading in degrees')
+            glider = args[1] if len(args) > 1 else None
+            print_points(db.errors_near(
+                float(args[0]), glider, options.within, options.since))
+
+if __name__ == '__main__':
+    main()
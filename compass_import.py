@@ -0,0 +1,103 @@
+#! /usr/bin/python
+
+"""compass_import
+    Gathers archives of saved compass checks (results CSV files and the
+    pickles and journals left in ~/.cc) into one columnar NumPy archive (see
+    cc.archive), reading the files in parallel processes, validating each
+    check and dropping duplicates.
+"""
+
+import optparse
+import sys
+from multiprocessing import Pool, cpu_count
+
+from cc.archive import (
+    read_saved, write_archive, find_files, dedupe, ArchiveException)
+from cc.deviation import fit_deviation
+from cc.history import HistoryDB
+
+parser = optparse.OptionParser(
+    usage="%prog [options] path [path ...]",
+    description=(
+        """Import compass checks from the given files and directories
+        (searched recursively for .csv, .ccj and .pckl files) into a
+        compressed .npz archive, along with the checks of any .npz archives
+        named.  Invalid files are reported and skipped; a check found in
+        more than one file is imported once."""))
+
+parser.add_option(
+    "-o", "--output",
+    help="Archive to write (default: compass_checks.npz).",
+    dest="output", default='compass_checks.npz', action='store')
+
+parser.add_option(
+    "-j", "--jobs",
+    help="Number of processes to read files with (default: one per CPU).",
+    dest="jobs", default=None, action='store', type=int)
+
+parser.add_option(
+    "--history",
+    help="Also add the imported checks to this history database.",
+    dest="history", default=None, action='store')
+
+parser.add_option(
+    "-q", "--quiet",
+    help="Do not report invalid files.",
+    dest="quiet", default=False, action='store_true')
+
+
+def load(path):
+    """Read one file in a worker process.  Returns (checks, None), or
+    (None, the reason it was skipped).
+    """
+    try:
+        return read_saved(path), None
+    except (ArchiveException, IOError, ValueError) as err:
+        # these already name the file
+        return None, str(err)
+    except KeyError as err:
+        # an archive missing one of its arrays
+        return None, '%s: no %s array' % (path, err)
+
+
+def main():
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.print_help()
+        exit()
+    paths = list(find_files(args))
+    checks = []
+    n_invalid = 0
+    pool = Pool(options.jobs or cpu_count())
+    try:
+        # results are taken as they come, in whatever order they finish
+        for loaded, reason in pool.imap_unordered(load, paths, chunksize=16):
+            if loaded is None:
+                n_invalid += 1
+                if not options.quiet:
+                    sys.stderr.write('Skipped %s\n' % reason)
+            else:
+                checks.extend(loaded)
+    finally:
+        pool.close()
+        pool.join()
+    kept = dedupe(checks)
+    print 'Read %d files: %d checks, %d duplicates, %d invalid' % (
+        len(paths), len(kept), len(checks) - len(kept), n_invalid)
+    if not kept:
+        return
+    write_archive(options.output, kept)
+    print 'Wrote %s' % options.output
+    if options.history:
+        with HistoryDB(options.history) as db:
+            for check in kept:
+                db.add_check(
+                    check.glider, check.tstamp, check.offset_deg,
+                    check.declination_deg, check,
+                    fit_deviation(check.column('glider_true_deg'),
+                                  check.column('error')),
+                    source=check.source)
+        print 'Added %d checks to %s' % (len(kept), options.history)
+
+if __name__ == '__main__':
+    main()
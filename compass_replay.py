@@ -0,0 +1,158 @@
+#! /usr/bin/python
+
+"""compass_replay
+    Reprocesses compass checks recorded with ``compass_check.py --capture``
+    through the same sensor parsing and compass point calculations, as fast
+    as the files can be read, optionally with a corrected offset or magnetic
+    declination.
+"""
+
+import optparse
+import os.path
+from datetime import datetime as dt
+from exceptions import Exception
+
+import matplotlib
+# plots are only saved, never shown
+matplotlib.use('Agg')
+import numpy as np
+
+from compass_check import CompassData, redtext
+from cc.capture import read_capture
+from cc.sensor_parser import sensor_dict
+
+parser = optparse.OptionParser(
+    usage="%prog [options] capturefile [capturefile ...]",
+    description=(
+        """Recalculate compass checks from capture (.cap) files and write the
+        results (and deviation fit) as <capture>_replay CSV files, and
+        optionally a PNG plot, next to each capture."""))
+
+parser.add_option(
+    "-o", "--offset",
+    help="Use this offset in degrees instead of the captured one.",
+    dest="offset", default=None, action='store', type=float)
+
+parser.add_option(
+    "-d", "--declination",
+    help=(
+        "Use this magnetic declination in degrees instead of the captured "
+        "one."),
+    dest="declination", default=None, action='store', type=float)
+
+parser.add_option(
+    "-n", "--samples",
+    help=(
+        "Use at most this many headings per point (default: as many as were "
+        "used in the check)."),
+    dest="samples", default=None, action='store', type=int)
+
+parser.add_option(
+    "--plot",
+    help="Also save a PNG plot of the errors for each capture.",
+    dest="plot", default=False, action='store_true')
+
+parser.add_option(
+    "-q", "--quiet",
+    help="Do not print the results of each capture.",
+    dest="quiet", default=False, action='store_true')
+
+
+class ReplayException(Exception):
+    pass
+
+
+class CapturedGlider():
+    """Plays back the compass points of a capture file in place of a glider
+    connection.  ``points`` holds a (pedestal heading, headings) tuple for
+    each point: the headings the check used, e.g. a streamed point's
+    settled window, or those parsed from the captured lines when these were
+    not recorded.
+    """
+    def __init__(self, path):
+        self.header, captured = read_capture(path)
+        self.points = []
+        for pd_hdg, lines, hdgs in captured:
+            if hdgs is None:
+                hdgs = []
+                for tstamp, line in lines:
+                    heading = sensor_dict(line).get('m_heading')
+                    if heading is not None:
+                        hdgs.append(heading)
+            if hdgs:
+                self.points.append((pd_hdg, hdgs))
+        self._next = 0
+
+    def read_headings(self, count=10, timeout=None):
+        pd_hdg, hdgs = self.points[self._next]
+        self._next += 1
+        return hdgs[:count]
+
+    def get_mag_var(self, try_lines=3, timeout=None):
+        return self.header.get('mag_var')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, etraceback):
+        pass
+
+
+def replay(path, offset=None, mag_var=None, n_samples=None):
+    """Rebuild the CompassData of the capture file at PATH.  OFFSET
+    (degrees), MAG_VAR (radians) and N_SAMPLES replace the captured values
+    when given.  Raises a ReplayException if the capture has no magnetic
+    declination and none is given.
+    """
+    glider = CapturedGlider(path)
+    header = glider.header
+    if offset is None:
+        offset = header.get('offset', 0.)
+    if mag_var is None:
+        mag_var = header.get('mag_var')
+    if mag_var is None:
+        raise ReplayException(
+            '%s: no magnetic declination captured, use -d' % path)
+    if n_samples is None:
+        n_samples = header.get('n_samples', 10)
+    glidername = header.get(
+        'glider', os.path.basename(path).split('_cc_')[0])
+    cd = CompassData(
+        glidername, None, offset, mag_var, n_samples=n_samples,
+        glider=glider, persist=False)
+    if 'tstamp' in header:
+        cd.tstamp = dt.strptime(header['tstamp'][:19], '%Y-%m-%dT%H:%M:%S')
+    # don't overwrite the results written by the original check
+    cd.fname = os.path.splitext(path)[0] + '_replay'
+    for pd_hdg, hdgs in glider.points:
+        cd.data[pd_hdg] = {'compass_sample_rad': hdgs[:n_samples]}
+    # every point is calculated in one go rather than one at a time
+    cd.recompute()
+    return cd
+
+
+def main():
+    (options, args) = parser.parse_args()
+    if not args:
+        redtext('\nGive at least one capture file\n')
+        parser.print_help()
+        exit()
+    mag_var = None
+    if options.declination is not None:
+        mag_var = np.deg2rad(options.declination)
+    for path in args:
+        try:
+            cd = replay(path, options.offset, mag_var, options.samples)
+        except ReplayException as err:
+            redtext(str(err))
+            continue
+        if not options.quiet:
+            print '\n%s' % path
+            cd.print_headings()
+            cd.print_deviation()
+        cd.write_data()
+        if options.plot:
+            cd.plot_data()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#! /usr/bin/python
+
+"""compass_report
+    Builds one HTML report of a bench day's (or a year's) compass checks:
+    a summary table of the fleet, overlay plots of all checks and of each
+    glider's checks, and each check's plot, points and deviation fit.  The
+    plots are drawn in parallel processes and cached, so rebuilding the
+    report only draws the plots of new or changed checks.
+"""
+
+import optparse
+import sys
+from multiprocessing import Pool, cpu_count
+
+from cc.archive import find_files, dedupe, EXTENSIONS
+from cc.report import write_report, DEFAULT_CACHE
+from compass_import import load
+
+parser = optparse.OptionParser(
+    usage="%prog [options] path [path ...]",
+    description=(
+        """Report on the compass checks in the given files and directories
+        (searched recursively for .csv, .ccj, .pckl and .npz files) in one
+        self-contained HTML file.  Invalid files are reported and skipped; a
+        check found in more than one file is reported once."""))
+
+parser.add_option(
+    "-o", "--output",
+    help="Report to write (default: compass_report.html).",
+    dest="output", default='compass_report.html', action='store')
+
+parser.add_option(
+    "-j", "--jobs",
+    help=("Number of processes to read files and draw plots with "
+          "(default: one per CPU)."),
+    dest="jobs", default=None, action='store', type=int)
+
+parser.add_option(
+    "--cache",
+    help="Directory of cached plots (default: %s)." % DEFAULT_CACHE,
+    dest="cache", default=DEFAULT_CACHE, action='store')
+
+parser.add_option(
+    "--tolerance",
+    help="Give each check a pass/fail verdict against this tolerance in "
+    "degrees.",
+    dest="tolerance", default=None, action='store', type=float)
+
+parser.add_option(
+    "-t", "--title",
+    help="Report title.",
+    dest="title", default='Compass Check Report', action='store')
+
+parser.add_option(
+    "-q", "--quiet",
+    help="Do not report invalid files.",
+    dest="quiet", default=False, action='store_true')
+
+
+def main():
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.print_help()
+        exit()
+    paths = list(find_files(args, EXTENSIONS + ('.npz',)))
+    checks = []
+    n_invalid = 0
+    pool = Pool(options.jobs or cpu_count())
+    try:
+        for loaded, reason in pool.imap_unordered(load, paths, chunksize=16):
+            if loaded is None:
+                n_invalid += 1
+                if not options.quiet:
+                    sys.stderr.write('Skipped %s\n' % reason)
+            else:
+                checks.extend(loaded)
+    finally:
+        pool.close()
+        pool.join()
+    kept = dedupe(checks)
+    print 'Read %d files: %d checks, %d duplicates, %d invalid' % (
+        len(paths), len(kept), len(checks) - len(kept), n_invalid)
+    if not kept:
+        return
+    n_drawn, n_cached = write_report(
+        options.output, kept, options.title, options.cache, options.jobs,
+        options.tolerance)
+    print 'Wrote %s (%d plots drawn, %d cached)' % (
+        options.output, n_drawn, n_cached)
+
+if __name__ == '__main__':
+    main()
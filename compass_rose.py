@@ -1,24 +1,105 @@
-# compass rose plots for glider compass checks
+#! /usr/bin/python
+
+"""compass_rose
+    Compass rose and error plots of saved compass checks, overlaying any
+    number of checks (e.g. a year of one glider's checks, or the whole
+    fleet's latest) on one figure.  Works without a display.
+"""
+
+import optparse
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from cc.archive import read_saved, ArchiveException
+from cc.plotting import compass_figure, pyplot, rose_collection, show
+
+parser = optparse.OptionParser(
+    usage="%prog [options] file [file ...]",
+    description=(
+        """Plot the compass checks in results CSV files, saved data and
+        .npz archives (from compass_import.py or --format npz) on one
+        figure: the compass rose of true against measured headings and the
+        errors with their fitted deviation curves."""))
+
+parser.add_option(
+    "-o", "--output",
+    help="Save the figure to this file (default: compass_rose.png).",
+    dest="output", default='compass_rose.png', action='store')
+
+parser.add_option(
+    "-g", "--glider",
+    help="Only plot the checks of this glider.",
+    dest="glider", default=None, action='store')
+
+parser.add_option(
+    "--since",
+    help="Only checks on or after this date (YYYY-MM-DD).",
+    dest="since", default=None, action='store')
+
+parser.add_option(
+    "--until",
+    help="Only checks on or before this date (YYYY-MM-DD).",
+    dest="until", default=None, action='store')
+
+parser.add_option(
+    "--no-fit",
+    help="Do not draw the fitted deviation curves.",
+    dest="fit", default=True, action='store_false')
+
+parser.add_option(
+    "-t", "--title",
+    help="Figure title.",
+    dest="title", default=None, action='store')
+
 
 def glider_compass_plot(true_directions, measured_directions):
+    """Plot a compass rose of TRUE_DIRECTIONS (blue) against
+    MEASURED_DIRECTIONS (red), both in degrees.
+    """
+    plt = pyplot()
+    plt.figure()
     ax = plt.subplot(111, polar=True)
     ax.set_theta_direction(-1)
     ax.set_theta_offset(0.5 * np.pi)
+    ax.set_ylim(0., 1.05)
+    # show the nominal directionals
+    rose_collection(ax, true_directions, colors='b', linewidths=1)
+    rose_collection(ax, measured_directions, colors='r', linewidths=2)
+    plt.title('True (blue) and measured (red) headings')
+    show()
 
-    def compass_plot(deg, clr, lw=2):
-        rad = np.deg2rad(deg)
-        ax.plot([rad, rad], [0, 1], color=clr, linewidth=lw)
 
-    # show the nominal directionals
-    for td in true_direction:
-        compass_plot(td, 'b', lw=1)
+def load_checks(paths):
+    """Read the checks saved in PATHS, skipping (and reporting) files that
+    cannot be read.
+    """
+    checks = []
+    for path in paths:
+        try:
+            checks.extend(read_saved(path))
+        except (ArchiveException, IOError, KeyError) as err:
+            print 'Skipped %s: %s' % (path, err)
+    return checks
+
 
-    for heading in measured_direction:
-        compass_plot(heading, 'r')
+def main():
+    (options, args) = parser.parse_args()
+    if not args:
+        parser.print_help()
+        exit()
+    checks = [
+        check for check in load_checks(args)
+        if (options.glider is None or check.glider == options.glider) and
+        (options.since is None or check.date >= options.since) and
+        (options.until is None or check.date <= options.until)]
+    if not checks:
+        print 'No checks to plot.'
+        return
+    checks.sort(key=lambda check: (check.date, check.time, check.glider))
+    fig = compass_figure(checks, options.title, options.fit)
+    fig.savefig(options.output)
+    print 'Plotted %d checks to %s' % (len(checks), options.output)
+    show()
 
-    plt.title('You choose')
-    plt.show()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -7,8 +7,15 @@ setup(
     author='Stuart Pearce',
     author_email='spearce@coas.oregonstate.edu',
     py_modules=[
-        'compass_check', 'cc.serial_rf',
-        'cc.parse_options', 'cc.dockserver_com'],
+        'compass_check', 'compass_replay', 'compass_history',
+        'compass_import', 'compass_rose', 'compass_report',
+        'cc.serial_rf', 'cc.parse_options', 'cc.dockserver_com', 'cc.errors',
+        'cc.sensor_parser', 'cc.circstats',
+        'cc.compass_store', 'cc.journal', 'cc.pending', 'cc.schedule',
+        'cc.capture', 'cc.streaming', 'cc.deviation',
+        'cc.planner', 'cc.history', 'cc.archive', 'cc.export',
+        'cc.plotting', 'cc.timing', 'cc.report', 'cc.live'],
+    packages=['cc.sim'],
     package_data={'cc': ['pickles/']},
     requires=['numpy', 'matplotlib', 'serial', 'dockserverTalk'],
 )
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Compass points taken from a simulated glider (cc.sim) over a pseudo
+terminal, reading the headings in each of compass_check's ways: a fixed
+number, streamed until settled and adaptively.
+"""
+import numpy as np
+import pytest
+
+import compass_check
+from cc.live import LineEcho
+from cc.sim import SimulatedGlider, PtyGlider
+from cc.streaming import HeadingStream
+
+pytestmark = pytest.mark.skipif(
+    PtyGlider is None, reason='pseudo-terminals are POSIX only')
+
+# the simulated compass's deviation, and so the error of every point, in
+# degrees
+DEVIATION = 2.
+HEADING = 45.
+
+
+@pytest.fixture
+def glider():
+    from cc.serial_rf import GliderRF
+    sim = SimulatedGlider(
+        heading=HEADING, deviation=(DEVIATION, 0., 0., 0., 0.), noise=0.2,
+        line_rate=20., junk=1, seed=0)
+    with PtyGlider(sim) as pty:
+        with GliderRF('simglider', pty.port, timeout=10.) as rf:
+            rf.echo = LineEcho(None)
+            yield rf
+
+
+def take_point(glider, **kwargs):
+    """Take the compass point at HEADING with a CompassData made with
+    KWARGS, returning the point saved.
+    """
+    cd = compass_check.CompassData(
+        'simglider', None, 0., glider.get_mag_var(), n_samples=10,
+        glider=glider, persist=False, **kwargs)
+    cd.pd_hdg = HEADING
+    if cd.stream:
+        # as run() sets up
+        cd.heading_stream = HeadingStream(glider)
+        cd.await_move = False
+    try:
+        cd.get_compass_point()
+    finally:
+        if cd.stream:
+            cd.heading_stream.stop()
+    return cd.data[HEADING]
+
+
+def check_error(point):
+    assert point['error'] == pytest.approx(DEVIATION, abs=0.5)
+
+
+def test_fixed(glider):
+    point = take_point(glider)
+    assert point['n_samples'] == 10
+    check_error(point)
+
+
+def test_stream(glider):
+    point = take_point(glider, stream=True, settle_deg=0.5)
+    assert 5 <= point['n_samples'] <= 10
+    check_error(point)
+
+
+def test_adaptive(glider):
+    point = take_point(glider, target_stderr=0.5, min_samples=3)
+    assert point['n_samples'] == 3
+    check_error(point)